@@ -0,0 +1,101 @@
+import logging
+import time
+
+from collections import Counter
+from typing import Awaitable, Callable, Optional, Tuple
+
+from app.config import settings
+from app.metrics import CACHE_REQUESTS
+from app.redis_client import (
+    acquire_lock,
+    bump_generation,
+    get_cached_data,
+    get_generation,
+    release_lock,
+    set_cached_data,
+)
+
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "data_version"
+
+# Per-worker counts of how analytics requests were served.
+cache_counters = Counter(hits=0, stale_hits=0, misses=0, recomputes=0)
+
+
+def _count(counter: str, result: str) -> None:
+    cache_counters[counter] += 1
+    CACHE_REQUESTS.labels("analytics", result).inc()
+
+
+async def bump_data_generation() -> None:
+    """Invalidate every cached analytics response after a write."""
+    await bump_generation(GENERATION_KEY)
+
+
+async def get_data_generation() -> Optional[str]:
+    """Version of the image data, bumped after every write; None without Redis."""
+    return await get_generation(GENERATION_KEY)
+
+
+def _cache_key(endpoint: str, params: dict) -> str:
+    args = "_".join(f"{name}={value}" for name, value in sorted(params.items()))
+    return f"analytics_{endpoint}_{args}"
+
+
+async def cached_analytics(
+    endpoint: str,
+    params: dict,
+    compute: Callable[[Optional[str]], Awaitable[dict]],
+    generation: Optional[str],
+) -> Tuple[dict, Optional[str]]:
+    """Serve ``compute(generation)`` from Redis until the data generation changes.
+
+    Entries outlive their freshness window so that, once they go stale,
+    one request recomputes under a lock while concurrent requests keep
+    getting the previous value. ``compute`` gets the generation its result
+    is stored under, so in-process copies of the data loaded before it can
+    reload first. ``generation`` must be read before calling, so a write
+    that lands meanwhile still invalidates the new entry. Returns the data
+    with the generation it was computed at.
+    """
+    key = _cache_key(endpoint, params)
+    entry = await get_cached_data(key)
+
+    if (
+        entry is not None
+        and entry["generation"] == generation
+        and entry["fresh_until"] > time.time()
+    ):
+        _count("hits", "hit")
+        return entry["data"], entry["generation"]
+
+    lock_key = f"{key}_lock"
+    lock_token = None
+    if entry is not None:
+        lock_token = await acquire_lock(
+            lock_key, settings.ANALYTICS_CACHE_LOCK_TIMEOUT
+        )
+        if lock_token is None:
+            _count("stale_hits", "stale_hit")
+            return entry["data"], entry["generation"]
+        _count("recomputes", "recompute")
+    else:
+        _count("misses", "miss")
+
+    try:
+        data = await compute(generation)
+        await set_cached_data(
+            key,
+            {
+                "generation": generation,
+                "fresh_until": time.time() + settings.ANALYTICS_CACHE_TTL,
+                "data": data,
+            },
+            expire=settings.ANALYTICS_CACHE_STALE_TTL,
+        )
+        return data, generation
+    finally:
+        if lock_token is not None:
+            await release_lock(lock_key, lock_token)
@@ -1,48 +1,92 @@
 import logging
+import os
 
-from fastapi import APIRouter, HTTPException
-from sqlalchemy import distinct, func, select
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from sqlalchemy import select
 
-from app.database import async_session_maker
-from app.models import ImageTag, Image
+from app.analytics_cache import (
+    cache_counters,
+    cached_analytics,
+    get_data_generation,
+)
+from app.config import settings
+from app.cooccurrence import cooccurrence_matrix
+from app.database import read_session
+from app.http_cache import make_etag, matching_etag, not_modified, with_cache_headers
+from app.models import TagStat
+from app.responses import FastJSONResponse
+from app.rollups import get_global_stats, tag_histogram, top_tags_sql
+from app.trends import BUCKET_STEPS, as_utc, load_trends
 from app.utils import *
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SortKey = Literal["count", "lift", "pmi", "jaccard"]
+
 router = APIRouter(
     prefix="/analytics",
     tags=["Аналитика"],
 )
 
 
+def _generation_etag(generation: Optional[str]) -> Optional[str]:
+    return make_etag("g", generation) if generation is not None else None
+
+
+async def _cached_response(
+    request: Request,
+    endpoint: str,
+    params: dict,
+    compute: Callable[[Optional[str]], Awaitable[dict]],
+) -> Response:
+    # Checked before the cache, so a client that is up to date gets its 304
+    # without anything being recomputed.
+    generation = await get_data_generation()
+    matched = matching_etag(request, _generation_etag(generation))
+    if matched:
+        return not_modified(matched)
+
+    data, data_generation = await cached_analytics(
+        endpoint, params, compute, generation
+    )
+    # A stale entry is tagged with the generation it was computed at.
+    etag = _generation_etag(data_generation)
+    # Cached data is plain JSON already, so skip FastAPI's jsonable_encoder.
+    return with_cache_headers(FastJSONResponse(data), etag)
+
+
 @router.get("/top-tags/")
-async def get_top_tags_analytics(limit: int = 5, min_confidence: float = 30.0):
-    async with async_session_maker() as session:
-        try:
-            total_images_result = await session.execute(select(func.count(Image.id)))
-            total_images = total_images_result.scalar() or 1
+async def get_top_tags_analytics(
+    request: Request, limit: int = 5, min_confidence: float = 30.0
+):
+    return await _cached_response(
+        request,
+        "top_tags",
+        {"limit": limit, "min_confidence": min_confidence},
+        lambda generation: _top_tags_analytics(limit, min_confidence, generation),
+    )
 
-            total_tags_result = await session.execute(select(func.count(ImageTag.id)))
-            total_tags = total_tags_result.scalar() or 0
+
+async def _top_tags_analytics(
+    limit: int, min_confidence: float, generation: Optional[str]
+) -> dict:
+    async with read_session() as session:
+        try:
+            global_stats = await get_global_stats(session)
+            total_images = global_stats.total_images or 1
+            total_tags = global_stats.total_tags
 
             avg_tags_per_image = total_tags / total_images if total_images > 0 else 0
-            stmt = (
-                select(
-                    ImageTag.tag_name,
-                    func.count(ImageTag.id).label("occurrence_count"),
-                    func.avg(ImageTag.confidence).label("avg_confidence"),
-                    func.count(distinct(ImageTag.image_id)).label("image_count"),
-                )
-                .where(ImageTag.confidence >= min_confidence)
-                .group_by(ImageTag.tag_name)
-                .order_by(func.count(ImageTag.id).desc())
-                .limit(limit)
-            )
 
-            result = await session.execute(stmt)
-            tag_analytics = result.all()
+            tag_analytics = await tag_histogram.top_tags(
+                min_confidence, global_stats.min_confidence, limit, generation
+            )
+            if tag_analytics is None:
+                tag_analytics = await top_tags_sql(session, min_confidence, limit)
 
             analytics_result = []
             for (
@@ -80,34 +124,34 @@ async def get_top_tags_analytics(limit: int = 5, min_confidence: float = 30.0):
 
 
 @router.get("/stats/")
-async def get_overall_stats():
-    async with async_session_maker() as session:
-        try:
-            total_images_result = await session.execute(select(func.count(Image.id)))
-            total_images = total_images_result.scalar() or 0
+async def get_overall_stats(request: Request):
+    return await _cached_response(
+        request, "stats", {}, lambda generation: _overall_stats()
+    )
+
 
-            total_tags_result = await session.execute(select(func.count(ImageTag.id)))
-            total_tags = total_tags_result.scalar() or 0
+async def _overall_stats() -> dict:
+    async with read_session() as session:
+        try:
+            global_stats = await get_global_stats(session)
+            total_images = global_stats.total_images
+            total_tags = global_stats.total_tags
 
             avg_tags_per_image = total_tags / total_images if total_images > 0 else 0
 
-            most_common_stmt = (
-                select(ImageTag.tag_name, func.count(ImageTag.id).label("count"))
-                .group_by(ImageTag.tag_name)
-                .order_by(func.count(ImageTag.id).desc())
+            most_common_result = await session.execute(
+                select(TagStat.tag_name, TagStat.occurrence_count).order_by(
+                    TagStat.occurrence_count.desc(), TagStat.tag_name
+                )
             )
-            most_common_result = await session.execute(most_common_stmt)
             most_common_tag = most_common_result.first()
 
-            highest_confidence_stmt = (
-                select(
-                    ImageTag.tag_name,
-                    func.avg(ImageTag.confidence).label("avg_confidence"),
+            avg_confidence = TagStat.confidence_sum / TagStat.occurrence_count
+            highest_confidence_result = await session.execute(
+                select(TagStat.tag_name, avg_confidence).order_by(
+                    avg_confidence.desc(), TagStat.tag_name
                 )
-                .group_by(ImageTag.tag_name)
-                .order_by(func.avg(ImageTag.confidence).desc())
             )
-            highest_confidence_result = await session.execute(highest_confidence_stmt)
             highest_confidence_tag = highest_confidence_result.first()
 
             return {
@@ -133,3 +177,145 @@ async def get_overall_stats():
         except Exception as e:
             logger.error(f"Error getting stats: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/co-occurrence/")
+async def get_cooccurring_tags(
+    request: Request,
+    tag: str,
+    limit: int = Query(10, ge=1, le=500),
+    sort_by: SortKey = "count",
+    min_count: int = Query(1, ge=1),
+):
+    return await _cached_response(
+        request,
+        "cooccurrence",
+        {"tag": tag, "limit": limit, "sort_by": sort_by, "min_count": min_count},
+        lambda generation: _cooccurring_tags(
+            tag, limit, sort_by, min_count, generation
+        ),
+    )
+
+
+async def _cooccurring_tags(
+    tag: str, limit: int, sort_by: str, min_count: int, generation: Optional[str]
+) -> dict:
+    try:
+        partners = await cooccurrence_matrix.partners(
+            tag, limit, sort_by, min_count, generation
+        )
+    except Exception as e:
+        logger.error(f"Error getting co-occurring tags: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if partners is None:
+        raise HTTPException(status_code=404, detail="Tag not found")
+
+    return {
+        "tag": tag,
+        "image_count": int(
+            cooccurrence_matrix.image_counts[cooccurrence_matrix.tag_index[tag]]
+        ),
+        "total_images": cooccurrence_matrix.total_images,
+        "sort_by": sort_by,
+        "co_occurring_tags": partners,
+    }
+
+
+@router.get("/co-occurrence/pairs/")
+async def get_top_tag_pairs(
+    request: Request,
+    limit: int = Query(20, ge=1, le=500),
+    sort_by: SortKey = "count",
+    min_count: int = Query(1, ge=1),
+):
+    return await _cached_response(
+        request,
+        "cooccurrence_pairs",
+        {"limit": limit, "sort_by": sort_by, "min_count": min_count},
+        lambda generation: _top_tag_pairs(limit, sort_by, min_count, generation),
+    )
+
+
+async def _top_tag_pairs(
+    limit: int, sort_by: str, min_count: int, generation: Optional[str]
+) -> dict:
+    try:
+        pairs = await cooccurrence_matrix.top_pairs(
+            limit, sort_by, min_count, generation
+        )
+    except Exception as e:
+        logger.error(f"Error getting top tag pairs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "total_images": cooccurrence_matrix.total_images,
+        "sort_by": sort_by,
+        "pairs": pairs,
+    }
+
+
+@router.get("/trends/")
+async def get_trends(
+    request: Request,
+    tag: List[str] = Query([], description="Tags to count per bucket"),
+    bucket: Literal["hour", "day", "week"] = "day",
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+):
+    # A window ending now slides with the clock, so only fixed ones get an ETag.
+    fixed_window = date_to is not None
+    date_to = as_utc(date_to) if date_to else datetime.now(timezone.utc)
+    date_from = (
+        as_utc(date_from)
+        if date_from
+        else date_to - timedelta(days=settings.TRENDS_DEFAULT_DAYS)
+    )
+    if date_from >= date_to:
+        raise HTTPException(status_code=400, detail="'from' must be before 'to'")
+    if (date_to - date_from) / BUCKET_STEPS[bucket] > settings.TRENDS_MAX_BUCKETS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Range spans more than {settings.TRENDS_MAX_BUCKETS} {bucket} buckets",
+        )
+
+    etag = None
+    if fixed_window:
+        generation = await get_data_generation()
+        if generation is not None:
+            etag = make_etag("g", generation)
+            matched = matching_etag(request, etag)
+            if matched:
+                return not_modified(matched)
+
+    async with read_session() as session:
+        try:
+            series = await load_trends(session, bucket, date_from, date_to, tag)
+            response = FastJSONResponse(
+                {
+                    "bucket": bucket,
+                    "from": date_from,
+                    "to": date_to,
+                    "total_images": sum(point["images"] for point in series),
+                    "series": series,
+                }
+            )
+            return with_cache_headers(response, etag)
+
+        except Exception as e:
+            logger.error(f"Error getting trends: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache-stats/")
+async def get_cache_stats():
+    served = sum(cache_counters.values())
+    return {
+        "worker_pid": os.getpid(),
+        **cache_counters,
+        "hit_ratio": (
+            round((cache_counters["hits"] + cache_counters["stale_hits"]) / served, 4)
+            if served
+            else 0
+        ),
+    }
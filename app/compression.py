@@ -0,0 +1,144 @@
+"""Response compression negotiated from Accept-Encoding: brotli, then gzip.
+
+Bodies under ``COMPRESSION_MINIMUM_SIZE`` and non-text content are sent as
+is. Streamed responses are flushed chunk by chunk, so ndjson consumers see
+rows as they come; server-sent events are never compressed.
+"""
+
+import asyncio
+import zlib
+
+from typing import Optional
+
+import brotli
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.config import settings
+
+
+# Compress bigger bodies in a thread rather than on the event loop.
+THREAD_THRESHOLD = 256 * 1024
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred encoding among br and gzip, or None for identity."""
+    qualities = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip()] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in ("br", "gzip"):
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _is_compressible(content_type: str) -> bool:
+    if content_type.startswith(EXCLUDED_CONTENT_TYPES):
+        return False
+    return content_type.startswith("text/") or "json" in content_type
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(
+                quality=settings.COMPRESSION_BROTLI_QUALITY
+            )
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(
+                settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16
+            )
+
+    def compress(self, chunk: bytes, final: bool) -> bytes:
+        if self._brotli is not None:
+            data = self._brotli.process(chunk)
+            return data + (self._brotli.finish() if final else self._brotli.flush())
+        mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+        return self._zlib.compress(chunk) + self._zlib.flush(mode)
+
+
+class CompressionMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def compress(chunk: bytes, final: bool) -> bytes:
+            if len(chunk) >= THREAD_THRESHOLD:
+                return await asyncio.to_thread(compressor.compress, chunk, final)
+            return compressor.compress(chunk, final)
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                compressible = _is_compressible(headers.get("content-type", ""))
+                if compressible:
+                    headers.add_vary_header("Accept-Encoding")
+                too_small = (
+                    not more_body and len(body) < settings.COMPRESSION_MINIMUM_SIZE
+                )
+                if "content-encoding" in headers or not compressible or too_small:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = _Compressor(encoding)
+                headers["Content-Encoding"] = encoding
+                # A strong ETag names exact bytes, so it changes with them.
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/") and etag.endswith('"'):
+                    headers["ETag"] = f'{etag[:-1]}-{encoding}"'
+                body = await compress(body, final=not more_body)
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+            else:
+                body = await compress(body, final=not more_body)
+
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Literal, Optional
 
 from pydantic_settings import BaseSettings
 
@@ -17,9 +17,32 @@ class Settings(BaseSettings):
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
+    DB_REPLICA_HOST: Optional[str] = None
+    DB_REPLICA_PORT: Optional[int] = None
+    DB_REPLICA_RETRY_AFTER: float = 5.0
+
+    @property
+    def DATABASE_REPLICA_URL(self):
+        if not self.DB_REPLICA_HOST:
+            return None
+        port = self.DB_REPLICA_PORT or self.DB_PORT
+        return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_REPLICA_HOST}:{port}/{self.DB_NAME}"
+
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_WARMUP: bool = True
+    DB_CONNECT_TIMEOUT: float = 10.0
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
     REDIS_HOST: str
     REDIS_PORT: int
     REDIS_PASSWORD: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_SOCKET_TIMEOUT: float = 0.5
+    REDIS_RETRY_AFTER: float = 5.0
 
     SECRET_KEY: str
     ALGORITHM: str
@@ -27,6 +50,93 @@ class Settings(BaseSettings):
     IMAGGA_API_URL: str
     IMAGGA_API_KEY: str
     IMAGGA_API_SECRET: str
+    IMAGGA_POOL_LIMIT: int = 100
+    IMAGGA_POOL_LIMIT_PER_HOST: int = 20
+    IMAGGA_DNS_CACHE_TTL: int = 300
+    IMAGGA_KEEPALIVE_TIMEOUT: float = 30.0
+    IMAGGA_CONNECT_TIMEOUT: float = 5.0
+    IMAGGA_READ_TIMEOUT: float = 30.0
+    IMAGGA_RATE_LIMIT: float = 10.0
+    IMAGGA_RATE_BURST: float = 10.0
+    IMAGGA_RATE_LIMIT_MAX_WAIT: float = 10.0
+    IMAGGA_MAX_RETRIES: int = 3
+    IMAGGA_RETRY_BACKOFF: float = 0.5
+    IMAGGA_RETRY_BACKOFF_MAX: float = 8.0
+    IMAGGA_BREAKER_FAILURES: int = 5
+    IMAGGA_BREAKER_RESET_TIMEOUT: float = 30.0
+
+    TAGGING_BACKEND: Literal["imagga", "record", "replay", "synthetic"] = "imagga"
+    TAGGING_RECORD_DIR: str = "tagging_recordings"
+    TAGGING_SYNTHETIC_LATENCY: Literal[
+        "constant", "uniform", "exponential", "lognormal"
+    ] = "lognormal"
+    TAGGING_SYNTHETIC_LATENCY_MEAN: float = 0.8
+    TAGGING_SYNTHETIC_LATENCY_SPREAD: float = 0.5
+    TAGGING_SYNTHETIC_ERROR_RATE: float = 0.0
+    TAGGING_SYNTHETIC_SEED: Optional[int] = None
+
+    UPLOAD_MAX_SIZE: int = 32 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    UPLOAD_SPOOL_THRESHOLD: int = 2 * 1024 * 1024
+
+    BATCH_MAX_FILES: int = 500
+    BATCH_MAX_TOTAL_SIZE: int = 256 * 1024 * 1024
+    BATCH_TAGGING_CONCURRENCY: int = 8
+
+    TAGGING_RESULT_CACHE_TTL: int = 7 * 24 * 3600
+
+    HASH_FILTER_CAPACITY: int = 5_000_000
+    HASH_FILTER_ERROR_RATE: float = 0.001
+    HASH_FILTER_REFRESH_INTERVAL: float = 5.0
+
+    IMAGES_PAGE_SIZE: int = 50
+    IMAGES_MAX_PAGE_SIZE: int = 500
+    IMAGES_STREAM_BATCH_SIZE: int = 1000
+
+    SEARCH_CACHE_HOT_TAGS: int = 0
+    SEARCH_CACHE_TTL: float = 60.0
+
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 6
+    PHASH_INDEX_REFRESH_INTERVAL: float = 5.0
+    INDEX_REFRESH_ID_LOOKBACK: int = 5000
+
+    # Without Redis, how stale /analytics/top-tags/ may be for whole-number
+    # thresholds; with it, writes reload the histogram on the next request.
+    TAG_HISTOGRAM_REFRESH_INTERVAL: float = 5.0
+
+    ANALYTICS_CACHE_TTL: float = 30.0
+    ANALYTICS_CACHE_STALE_TTL: int = 3600
+    ANALYTICS_CACHE_LOCK_TIMEOUT: float = 10.0
+
+    COOCCURRENCE_CHUNK_SIZE: int = 200_000
+    COOCCURRENCE_REFRESH_INTERVAL: float = 60.0
+
+    TRENDS_DEFAULT_DAYS: int = 30
+    TRENDS_MAX_BUCKETS: int = 10_000
+
+    JOB_WORKERS: int = 2
+    JOB_POLL_INTERVAL: float = 1.0
+    JOB_VISIBILITY_TIMEOUT: float = 120.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF: float = 2.0
+    JOB_RETRY_BACKOFF_MAX: float = 300.0
+    JOB_EVENTS_POLL_INTERVAL: float = 0.5
+    # Queued images wait here; must be shared with any `python -m app.jobs`.
+    JOB_PAYLOAD_DIR: str = "job_payloads"
+
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    HTTP_CACHE_MAX_AGE: int = 0
+    HTTP_CACHE_SHARED_MAX_AGE: int = 5
+    HTTP_CACHE_STALE_WHILE_REVALIDATE: int = 30
+
+    PROFILING_ADMIN_TOKEN: Optional[str] = None
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_SLOW_REQUEST_THRESHOLD: float = 5.0
+    PROFILING_DIR: str = "profiles"
+    PROFILING_MAX_CAPTURES: int = 200
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import time
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models import GlobalStat, ImageTag, Tag, TagCooccurrence, TagStat
+
+
+logger = logging.getLogger(__name__)
+
+PairArrays = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _incidence_chunk(
+    image_ids: np.ndarray, tag_indices: np.ndarray, tag_count: int
+) -> sparse.csr_matrix:
+    _, rows = np.unique(image_ids, return_inverse=True)
+    return sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, tag_indices)),
+        shape=(rows.max() + 1 if len(rows) else 0, tag_count),
+    )
+
+
+async def compute_cooccurrence(
+    session: AsyncSession,
+) -> Tuple[np.ndarray, sparse.coo_matrix]:
+    """Count tag pairs straight from image_tags as ``AᵀA``.
+
+    ``A`` is the image × tag incidence matrix. It is built and multiplied
+    COOCCURRENCE_CHUNK_SIZE tag rows at a time, so only the tag × tag
+    result is ever held in full. Returns the sorted tag names and the strict upper
+    triangle of the product, indexed by position in that list.
+    """
+    result = await session.execute(select(Tag.id, Tag.name))
+    tag_ids = result.all()
+    # Tags are counted by name, so a name shared by several languages maps
+    # all of its ids onto one row of the matrix.
+    tag_names = np.array(sorted({name for _, name in tag_ids}), dtype=object)
+    name_index = {tag_name: i for i, tag_name in enumerate(tag_names.tolist())}
+    tag_index = {tag_id: name_index[name] for tag_id, name in tag_ids}
+
+    counts = sparse.csr_matrix((len(tag_names), len(tag_names)), dtype=np.int64)
+    carry_ids = np.empty(0, dtype=np.int64)
+    carry_tags = np.empty(0, dtype=np.int64)
+
+    result = await session.stream(
+        select(ImageTag.image_id, ImageTag.tag_id)
+        .order_by(ImageTag.image_id)
+        .execution_options(yield_per=settings.COOCCURRENCE_CHUNK_SIZE)
+    )
+    async for rows in result.partitions():
+        image_ids = np.concatenate(
+            [carry_ids, np.array([row[0] for row in rows], dtype=np.int64)]
+        )
+        tag_indices = np.concatenate(
+            [
+                carry_tags,
+                np.array([tag_index[row[1]] for row in rows], dtype=np.int64),
+            ]
+        )
+        # The last image may continue in the next partition; hold it back so
+        # its pairs are counted in one piece.
+        split = np.searchsorted(image_ids, image_ids[-1], side="left")
+        carry_ids, carry_tags = image_ids[split:], tag_indices[split:]
+        if split:
+            chunk = _incidence_chunk(
+                image_ids[:split], tag_indices[:split], len(tag_names)
+            )
+            counts = counts + (chunk.T @ chunk).astype(np.int64)
+
+    if len(carry_ids):
+        chunk = _incidence_chunk(carry_ids, carry_tags, len(tag_names))
+        counts = counts + (chunk.T @ chunk).astype(np.int64)
+
+    return tag_names, sparse.triu(counts, k=1).tocoo()
+
+
+def _pair_arrays(rows, tag_index: Dict[str, int]) -> PairArrays:
+    """Row and column positions and counts of ``(tag_a, tag_b, image_count)`` rows."""
+    count = len(rows)
+    tag_a = np.fromiter(
+        (tag_index.get(row[0], -1) for row in rows), dtype=np.int64, count=count
+    )
+    tag_b = np.fromiter(
+        (tag_index.get(row[1], -1) for row in rows), dtype=np.int64, count=count
+    )
+    image_counts = np.fromiter((row[2] for row in rows), dtype=np.int64, count=count)
+    # Pairs of a tag committed after tag_stats was read wait for the next refresh.
+    known = (tag_a >= 0) & (tag_b >= 0)
+    return tag_a[known], tag_b[known], image_counts[known]
+
+
+def score_pairs(
+    pair_counts: np.ndarray,
+    counts_a: np.ndarray,
+    counts_b: np.ndarray,
+    total_images: int,
+) -> Dict[str, np.ndarray]:
+    pair_counts = pair_counts.astype(np.float64)
+    lift = pair_counts * total_images / (counts_a * counts_b)
+    return {
+        "count": pair_counts,
+        "lift": lift,
+        "pmi": np.log2(lift),
+        "jaccard": pair_counts / (counts_a + counts_b - pair_counts),
+    }
+
+
+def _top(scores: Dict[str, np.ndarray], sort_by: str, limit: int) -> np.ndarray:
+    metric, pair_counts = scores[sort_by], scores["count"]
+    candidates = np.arange(len(metric))
+    if len(metric) > limit:
+        kth = np.partition(metric, len(metric) - limit)[len(metric) - limit]
+        candidates = np.flatnonzero(metric >= kth)
+    # lexsort is stable, so full ties keep the name order of the input.
+    order = np.lexsort((-pair_counts[candidates], -metric[candidates]))
+    return candidates[order][:limit]
+
+
+class CooccurrenceMatrix:
+    """In-process copy of ``tag_cooccurrence`` as a symmetric CSR matrix.
+
+    Rows and columns follow the sorted tag names, so partners of one tag
+    are a single row slice and pair rankings are scored with vectorized
+    NumPy over the stored pairs. The copy is reloaded when asked for a newer
+    data generation than it was loaded at. Once it is merely older than
+    COOCCURRENCE_REFRESH_INTERVAL it is reloaded in the background while
+    requests keep using it.
+    """
+
+    def __init__(self):
+        self.tag_names = np.empty(0, dtype=object)
+        self.tag_index: Dict[str, int] = {}
+        self.image_counts = np.zeros(0, dtype=np.int64)
+        self.total_images = 0
+        self.counts = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self.pairs = sparse.coo_matrix((0, 0), dtype=np.int64)
+        self.last_refresh = 0.0
+        self.generation: Optional[str] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def refresh(self, generation: Optional[str] = None) -> None:
+        """Reload; ``generation`` must have been read before calling."""
+        async with self._lock:
+            await self._reload(generation)
+
+    async def _reload(self, generation: Optional[str]) -> None:
+        pair_chunks = []
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(TagStat.tag_name, TagStat.image_count)
+            )
+            tag_stats = sorted(result.all())
+            total_images = await session.scalar(select(GlobalStat.total_images))
+            tag_index = {row[0]: i for i, row in enumerate(tag_stats)}
+
+            result = await session.stream(
+                select(
+                    TagCooccurrence.tag_a,
+                    TagCooccurrence.tag_b,
+                    TagCooccurrence.image_count,
+                ).execution_options(yield_per=settings.COOCCURRENCE_CHUNK_SIZE)
+            )
+            async for rows in result.partitions():
+                pair_chunks.append(_pair_arrays(rows, tag_index))
+
+        self.load(tag_stats, total_images or 0, pair_chunks)
+        self.generation = generation
+
+    def load(
+        self, tag_stats: list, total_images: int, pair_chunks: List[PairArrays]
+    ) -> None:
+        """Rebuild from name-sorted ``(tag_name, image_count)`` rows and pairs."""
+        tag_names = np.array([row[0] for row in tag_stats], dtype=object)
+        if pair_chunks:
+            rows, columns, pair_counts = (
+                np.concatenate(arrays) for arrays in zip(*pair_chunks)
+            )
+        else:
+            rows = columns = pair_counts = np.empty(0, dtype=np.int64)
+
+        shape = (len(tag_names), len(tag_names))
+        pairs = sparse.coo_matrix((pair_counts, (rows, columns)), shape=shape)
+        self.tag_names = tag_names
+        self.tag_index = {tag_name: i for i, tag_name in enumerate(tag_names.tolist())}
+        self.image_counts = np.fromiter(
+            (row[1] for row in tag_stats), dtype=np.int64, count=len(tag_stats)
+        )
+        self.total_images = total_images
+        self.pairs = pairs.tocsr().tocoo()
+        self.counts = (pairs + pairs.T).tocsr()
+        self.counts.sort_indices()
+        self.last_refresh = time.monotonic()
+
+    def _outdated(self, generation: Optional[str]) -> bool:
+        # Never loaded, or loaded before writes this answer has to include.
+        if not self.last_refresh:
+            return True
+        return generation is not None and generation != self.generation
+
+    def _expired(self) -> bool:
+        refresh_age = time.monotonic() - self.last_refresh
+        return refresh_age > settings.COOCCURRENCE_REFRESH_INTERVAL
+
+    async def _refresh_if_stale(self, generation: Optional[str]) -> None:
+        if self._outdated(generation):
+            async with self._lock:
+                # Another request may have reloaded it while this one waited.
+                if self._outdated(generation):
+                    await self._reload(generation)
+            return
+
+        if self._expired() and (
+            self._refresh_task is None or self._refresh_task.done()
+        ):
+            self._refresh_task = asyncio.create_task(
+                self._refresh_expired(generation)
+            )
+
+    async def _refresh_expired(self, generation: Optional[str]) -> None:
+        try:
+            async with self._lock:
+                if self._expired():
+                    await self._reload(generation)
+        except Exception as e:
+            logger.error(f"Error refreshing co-occurrence matrix: {str(e)}")
+
+    def _entries(self, scores, positions) -> List[dict]:
+        return [
+            {
+                "image_count": int(scores["count"][position]),
+                "lift": round(float(scores["lift"][position]), 4),
+                "pmi": round(float(scores["pmi"][position]), 4),
+                "jaccard": round(float(scores["jaccard"][position]), 4),
+            }
+            for position in positions
+        ]
+
+    async def partners(
+        self,
+        tag_name: str,
+        limit: int,
+        sort_by: str = "count",
+        min_count: int = 1,
+        generation: Optional[str] = None,
+    ) -> Optional[List[dict]]:
+        await self._refresh_if_stale(generation)
+        if tag_name not in self.tag_index:
+            return None
+
+        row = self.counts.getrow(self.tag_index[tag_name])
+        keep = row.data >= min_count
+        partners, pair_counts = row.indices[keep], row.data[keep]
+
+        scores = score_pairs(
+            pair_counts,
+            self.image_counts[self.tag_index[tag_name]],
+            self.image_counts[partners],
+            self.total_images,
+        )
+        positions = _top(scores, sort_by, limit)
+        return [
+            {"tag_name": self.tag_names[partners[position]], **entry}
+            for position, entry in zip(positions, self._entries(scores, positions))
+        ]
+
+    async def top_pairs(
+        self,
+        limit: int,
+        sort_by: str = "count",
+        min_count: int = 1,
+        generation: Optional[str] = None,
+    ) -> List[dict]:
+        await self._refresh_if_stale(generation)
+
+        keep = self.pairs.data >= min_count
+        rows, columns = self.pairs.row[keep], self.pairs.col[keep]
+        scores = score_pairs(
+            self.pairs.data[keep],
+            self.image_counts[rows],
+            self.image_counts[columns],
+            self.total_images,
+        )
+        positions = _top(scores, sort_by, limit)
+        return [
+            {
+                "tag_a": self.tag_names[rows[position]],
+                "tag_b": self.tag_names[columns[position]],
+                **entry,
+            }
+            for position, entry in zip(positions, self._entries(scores, positions))
+        ]
+
+
+cooccurrence_matrix = CooccurrenceMatrix()
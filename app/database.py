@@ -1,15 +1,132 @@
-from sqlalchemy import NullPool
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import asyncio
+import logging
+import time
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 from app.config import settings
+from app.metrics import TimedAsyncQueuePool, instrument_engine
+from app.profiling import capture_sql
+
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.DATABASE_URL
 
-engine = create_async_engine(DATABASE_URL)
+REPLICA_ERRORS = (DBAPIError, OSError, asyncio.TimeoutError, PoolTimeoutError)
+
+
+def create_engine(url: str) -> AsyncEngine:
+    engine = create_async_engine(
+        url,
+        poolclass=TimedAsyncQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "timeout": settings.DB_CONNECT_TIMEOUT,
+        },
+    )
+    instrument_engine(engine.sync_engine)
+    capture_sql(engine.sync_engine)
+    return engine
+
+
+engine = create_engine(DATABASE_URL)
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+replica_engine = (
+    create_engine(settings.DATABASE_REPLICA_URL)
+    if settings.DATABASE_REPLICA_URL
+    else None
+)
+
+replica_session_maker = (
+    async_sessionmaker(replica_engine, expire_on_commit=False)
+    if replica_engine is not None
+    else None
+)
+
+_replica_unavailable_until = 0.0
+
+
+def _mark_replica_unavailable(e: Exception) -> None:
+    global _replica_unavailable_until
+    _replica_unavailable_until = time.monotonic() + settings.DB_REPLICA_RETRY_AFTER
+    logger.warning(f"Read replica unavailable, reading from primary: {str(e)}")
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """A session on the read replica, or on the primary if there is none.
+
+    For reads that can tolerate replica lag. A replica that can't be
+    connected to is skipped for ``DB_REPLICA_RETRY_AFTER`` seconds.
+    """
+    if (
+        replica_session_maker is not None
+        and time.monotonic() >= _replica_unavailable_until
+    ):
+        session = replica_session_maker()
+        try:
+            await session.connection()
+        except REPLICA_ERRORS as e:
+            await session.close()
+            _mark_replica_unavailable(e)
+        else:
+            async with session:
+                yield session
+            return
+
+    async with async_session_maker() as session:
+        yield session
+
+
+async def _warm_up(engine: AsyncEngine) -> None:
+    # Held open together so each is a distinct connection; closing them
+    # hands them all back to the pool.
+    connections = []
+    try:
+        for _ in range(settings.DB_POOL_SIZE):
+            connections.append(await engine.connect())
+    finally:
+        await asyncio.gather(*(connection.close() for connection in connections))
+
+
+async def warm_up_pools() -> None:
+    """Fill the pools up front, so the first requests don't pay for connecting."""
+    if not settings.DB_POOL_WARMUP:
+        return
+
+    await _warm_up(engine)
+    if replica_engine is not None:
+        try:
+            await _warm_up(replica_engine)
+        except REPLICA_ERRORS as e:
+            _mark_replica_unavailable(e)
+    logger.info(f"Opened {settings.DB_POOL_SIZE} database connections per pool")
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
 
 class Base(DeclarativeBase):
     pass
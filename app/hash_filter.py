@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import math
+import time
+
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import async_session_maker
+from app.id_cursor import IdCursor
+from app.models import Image
+
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, image_hash: str):
+        # image_hash is already a uniformly distributed SHA-256 hex digest, so
+        # two 64-bit slices of it are enough for double hashing.
+        h1 = int(image_hash[:16], 16)
+        h2 = int(image_hash[16:32], 16) | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, image_hash: str) -> None:
+        for position in self._positions(image_hash):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, image_hash: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(image_hash)
+        )
+
+
+class KnownHashes:
+    def __init__(self):
+        self.filter = BloomFilter(
+            settings.HASH_FILTER_CAPACITY, settings.HASH_FILTER_ERROR_RATE
+        )
+        self.count = 0
+        self.cursor = IdCursor(settings.INDEX_REFRESH_ID_LOOKBACK)
+        self.last_refresh = 0.0
+        self.loaded = False
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> int:
+        count = 0
+        async with self._lock, async_session_maker() as session:
+            result = await session.stream(
+                select(Image.id, Image.image_hash)
+                .where(self.cursor.condition(Image.id))
+                .order_by(Image.id)
+                .execution_options(yield_per=10000)
+            )
+            async for image_id, image_hash in result:
+                if self.cursor.advance(image_id):
+                    self.filter.add(image_hash)
+                    count += 1
+            self.cursor.prune()
+
+        self.count += count
+        self.last_refresh = time.monotonic()
+        self.loaded = True
+        return count
+
+    async def load(self) -> None:
+        count = await self.refresh()
+        logger.info(f"Loaded {count} known image hashes into the hash filter")
+        if self.count > settings.HASH_FILTER_CAPACITY:
+            logger.warning(
+                "Hash filter is over capacity, raise HASH_FILTER_CAPACITY "
+                "to keep the false positive rate down"
+            )
+
+    async def might_contain(self, image_hash: str) -> bool:
+        if not self.loaded:
+            return True
+        if image_hash in self.filter:
+            return True
+
+        # Other workers insert images too; pick up their hashes before trusting
+        # a negative answer if our copy is getting old.
+        refresh_age = time.monotonic() - self.last_refresh
+        if refresh_age > settings.HASH_FILTER_REFRESH_INTERVAL:
+            await self.refresh()
+            return image_hash in self.filter
+
+        return False
+
+    def add(self, image_hash: str) -> None:
+        self.filter.add(image_hash)
+
+
+known_hashes = KnownHashes()
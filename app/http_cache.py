@@ -0,0 +1,68 @@
+"""ETags, conditional GETs and Cache-Control for read endpoints.
+
+ETags come from cheap data versions rather than from the response body,
+so a matching ``If-None-Match`` is answered with 304 before the route runs
+its queries. The compression middleware tags compressed bodies with the
+encoding (``"g42"`` becomes ``"g42-br"``); matching ignores that suffix.
+"""
+
+from typing import Optional
+
+from fastapi import Request, Response
+
+from app.config import settings
+
+
+ENCODING_SUFFIXES = ("-br", "-gzip")
+
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def cache_control() -> str:
+    return (
+        f"public, max-age={settings.HTTP_CACHE_MAX_AGE}, "
+        f"s-maxage={settings.HTTP_CACHE_SHARED_MAX_AGE}, "
+        f"stale-while-revalidate={settings.HTTP_CACHE_STALE_WHILE_REVALIDATE}"
+    )
+
+
+def _strip_encoding(etag: str) -> str:
+    for suffix in ENCODING_SUFFIXES:
+        if etag.endswith(f'{suffix}"'):
+            return etag[: -len(suffix) - 1] + '"'
+    return etag
+
+
+def matching_etag(request: Request, etag: Optional[str]) -> Optional[str]:
+    """The ``If-None-Match`` entry that matches ``etag``, as the client sent it."""
+    header = request.headers.get("if-none-match")
+    if etag is None or not header:
+        return None
+    if header.strip() == "*":
+        return etag
+
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison.
+        if _strip_encoding(candidate.removeprefix("W/")) == etag:
+            return candidate
+    return None
+
+
+def not_modified(etag: str) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": etag, "Cache-Control": cache_control()}
+    )
+
+
+def with_cache_headers(response: Response, etag: Optional[str]) -> Response:
+    """Mark a response cacheable; without an ETag it must not be reused."""
+    if etag is None:
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control()
+    return response
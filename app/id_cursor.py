@@ -0,0 +1,57 @@
+from typing import Set
+
+
+class IdCursor:
+    """Which image ids an incrementally refreshed in-memory copy has loaded.
+
+    Ids are allocated before commit, so a row can become visible after
+    higher ids were already read. Ids skipped over within ``lookback`` of
+    the newest one are remembered and asked for again on every refresh
+    until they show up; ids left behind by rolled-back inserts age out.
+    Ids the process loaded on its own, as it inserted them, are marked with
+    ``added`` so the stream doesn't load them a second time.
+    """
+
+    def __init__(self, lookback: int):
+        self.lookback = lookback
+        self.last_id = 0
+        self.missing: Set[int] = set()
+        self.added_ids: Set[int] = set()
+
+    def condition(self, column):
+        if not self.missing:
+            return column > self.last_id
+        return (column > self.last_id) | column.in_(sorted(self.missing))
+
+    def added(self, image_id: int) -> bool:
+        """Record an id loaded outside the stream; False if the stream had it."""
+        # Not advanced past: the ids below it may not have been read yet.
+        if image_id > self.last_id or image_id in self.missing:
+            self.added_ids.add(image_id)
+            return True
+        return False
+
+    def advance(self, image_id: int) -> bool:
+        """Record a streamed id; False if it had been loaded already."""
+        if image_id > self.last_id:
+            start = max(self.last_id + 1, image_id - self.lookback)
+            self.missing.update(range(start, image_id))
+            self.last_id = image_id
+            if len(self.missing) > 2 * self.lookback:
+                self.prune()
+        elif image_id in self.missing:
+            self.missing.discard(image_id)
+        else:
+            return False
+
+        if image_id in self.added_ids:
+            self.added_ids.discard(image_id)
+            return False
+        return True
+
+    def prune(self) -> None:
+        floor = self.last_id - self.lookback
+        self.missing = {image_id for image_id in self.missing if image_id > floor}
+        self.added_ids = {
+            image_id for image_id in self.added_ids if image_id > floor
+        }
@@ -1,13 +1,60 @@
-import aiohttp
+import asyncio
 import logging
+import math
 
 from datetime import datetime, timezone
-from fastapi import APIRouter, File, UploadFile, HTTPException
-from sqlalchemy import select
+from typing import List, Literal, Optional, Tuple
+from fastapi import APIRouter, File, Query, Request, UploadFile, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert
 
-from app.database import async_session_maker
-from app.models import ImageTag, Image
-from app.utils import calculate_image_hash, check_duplicate_image, get_optimal_tags
+from app.analytics_cache import bump_data_generation, get_data_generation
+from app.database import async_session_maker, read_session
+from app.hash_filter import known_hashes
+from app.http_cache import make_etag, matching_etag, not_modified, with_cache_headers
+from app.imagga_client import ImaggaAPIError
+from app.ingest import (
+    DuplicateImageError,
+    build_tag_rows,
+    fetch_tags,
+    image_stored,
+    insert_image_tags,
+    store_image,
+)
+from app.jobs import enqueue_job, job_status
+from app.models import ImageTag, Image, Tag
+from app.phash_index import phash_index
+from app.responses import FastJSONResponse, dumps
+from app.rollups import apply_tag_stats
+from app.tag_index import posting_cache, search_tags_sql
+from app.tag_dictionary import tag_dictionary
+from app.tagging_backends import tagging_backend
+from app.tagging_store import (
+    cache_tagging_results,
+    get_tagging_result,
+    get_tagging_results,
+    save_tagging_results,
+)
+from app.utils import (
+    BatchTooLargeError,
+    ByteBudget,
+    UploadTooLargeError,
+    calculate_perceptual_hash,
+    check_duplicate_image,
+    close_spools,
+    decode_cursor,
+    encode_cursor,
+    find_existing_hashes,
+    get_optimal_tags,
+    get_similar_images,
+    is_zip_upload,
+    load_image_tags,
+    measure_zip,
+    spool_payload,
+    spool_upload,
+    spool_zip_entries,
+)
 from app.config import settings
 
 
@@ -25,154 +72,736 @@ async def upload_image(
     file: UploadFile = File(..., description="Image file to process"),
     confidence_threshold: float = 30.0,
     language: str = "en",
+    reject_near_duplicates: bool = False,
+    wait: bool = Query(
+        True, description="false queues the image and returns 202 with a job id"
+    ),
 ):
-    try:
-        image_data = await file.read()
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="File must be an image")
 
-        if not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
+    spool = None
+    try:
+        spool, file_size, image_hash = await spool_upload(file)
 
-        image_hash = calculate_image_hash(image_data)
         is_duplicate = await check_duplicate_image(image_hash)
         if is_duplicate:
             raise HTTPException(
                 status_code=409, detail="Duplicate image already exists"
             )
 
-        params = {"language": language}
+        perceptual_hash = await asyncio.to_thread(calculate_perceptual_hash, spool)
+        if reject_near_duplicates and perceptual_hash is not None:
+            similar = await get_similar_images(
+                perceptual_hash, settings.NEAR_DUPLICATE_MAX_DISTANCE
+            )
+            if similar:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Near-duplicate of image {similar[0][0]} already exists",
+                )
 
-        async with aiohttp.ClientSession() as http_session:
-            form_data = aiohttp.FormData()
-            form_data.add_field(
-                "image",
-                image_data,
+        if not wait:
+            job = await enqueue_job(
                 filename=file.filename,
                 content_type=file.content_type,
+                file_size=file_size,
+                image_hash=image_hash,
+                perceptual_hash=perceptual_hash,
+                image=spool,
+                confidence_threshold=confidence_threshold,
+                language=language,
+            )
+            return JSONResponse(
+                status_code=202,
+                content=job_status(job),
+                headers={"Location": f"/image/jobs/{job.id}"},
             )
 
-            async with http_session.post(
-                settings.IMAGGA_API_URL,
-                auth=aiohttp.BasicAuth(
-                    settings.IMAGGA_API_KEY, settings.IMAGGA_API_SECRET
-                ),
-                data=form_data,
-                params=params,
-                timeout=30,
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise HTTPException(
-                        status_code=response.status,
-                        detail=f"Imagga API error: {error_text}",
-                    )
+        raw_tags = await fetch_tags(
+            image_hash,
+            spool_payload(spool, file_size),
+            file.filename,
+            file.content_type,
+            language,
+        )
 
-                imagga_data = await response.json()
+        async with async_session_maker() as session:
+            try:
+                response = await store_image(
+                    session,
+                    filename=file.filename,
+                    content_type=file.content_type,
+                    file_size=file_size,
+                    image_hash=image_hash,
+                    perceptual_hash=perceptual_hash,
+                    raw_tags=raw_tags,
+                    confidence_threshold=confidence_threshold,
+                    language=language,
+                )
+            except DuplicateImageError:
+                raise HTTPException(
+                    status_code=409, detail="Duplicate image already exists"
+                )
+            await session.commit()
+
+        await image_stored(response["image_id"], image_hash, perceptual_hash)
+        return response
 
-        optimal_tags = get_optimal_tags(
-            imagga_data["result"]["tags"], confidence_threshold
+    except UploadTooLargeError:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the {settings.UPLOAD_MAX_SIZE} byte upload limit",
         )
+    except ImaggaAPIError as e:
+        raise _imagga_http_error(e)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Imagga API timed out")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing image: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if spool is not None:
+            spool.close()
 
-        async with async_session_maker() as session:
-            db_image = Image(
-                filename=file.filename,
-                original_filename=file.filename,
-                file_size=len(image_data),
-                mime_type=file.content_type,
-                image_hash=image_hash,
-                processed_date=datetime.now(timezone.utc),
+
+def _imagga_http_error(error: ImaggaAPIError) -> HTTPException:
+    # Client errors pass through; Imagga being down is a bad gateway unless
+    # we know when to come back.
+    status_code = error.status
+    if status_code >= 500:
+        status_code = 503 if error.retry_after is not None else 502
+
+    headers = None
+    if error.retry_after is not None:
+        headers = {"Retry-After": str(math.ceil(error.retry_after))}
+    return HTTPException(
+        status_code=status_code,
+        detail=f"Imagga API error: {error.detail}",
+        headers=headers,
+    )
+
+
+async def _measure_batch_file(file: UploadFile) -> Tuple[int, int]:
+    if is_zip_upload(file):
+        return await asyncio.to_thread(measure_zip, file.file)
+    return 1, file.size or 0
+
+
+async def _spool_batch_file(file: UploadFile, budget: ByteBudget) -> List[dict]:
+    if is_zip_upload(file):
+        return await asyncio.to_thread(spool_zip_entries, file.file, budget)
+
+    item = {"filename": file.filename, "content_type": file.content_type}
+    if not file.content_type or not file.content_type.startswith("image/"):
+        item["error"] = "File must be an image"
+        return [item]
+
+    try:
+        item["spool"], item["file_size"], item["image_hash"] = await spool_upload(
+            file, budget
+        )
+        item["perceptual_hash"] = await asyncio.to_thread(
+            calculate_perceptual_hash, item["spool"]
+        )
+    except UploadTooLargeError:
+        item["error"] = "File exceeds the upload size limit"
+
+    return [item]
+
+
+async def _tag_batch_item(item: dict, semaphore: asyncio.Semaphore, language: str):
+    async with semaphore:
+        try:
+            imagga_data = await tagging_backend.tag_image(
+                spool_payload(item["spool"], item["file_size"]),
+                filename=item["filename"],
+                content_type=item["content_type"],
+                language=language,
+                key=item["image_hash"],
             )
+            item["raw_tags"] = imagga_data["result"]["tags"]
+        except ImaggaAPIError as e:
+            item["error"] = f"Imagga API error: {e.detail}"
+        except asyncio.TimeoutError:
+            item["error"] = "Imagga API timed out"
+        except Exception as e:
+            logger.error(f"Error tagging {item['filename']}: {str(e)}")
+            item["error"] = str(e)
 
-            session.add(db_image)
-            await session.flush()
 
-            for tag_data in optimal_tags:
-                db_tag = ImageTag(
-                    image_id=db_image.id,
-                    tag_name=tag_data["tag_name"],
-                    confidence=tag_data["confidence"],
-                    language=language,
-                    is_primary=tag_data["is_primary"],
+@router.post("/upload-batch/")
+async def upload_images_batch(
+    files: List[UploadFile] = File(
+        ..., description="Image files and/or zip archives of images"
+    ),
+    confidence_threshold: float = 30.0,
+    language: str = "en",
+):
+    batch_too_large = HTTPException(
+        status_code=400,
+        detail=(
+            f"Batch exceeds the {settings.BATCH_MAX_TOTAL_SIZE} byte "
+            "uncompressed size limit"
+        ),
+    )
+    items = []
+    try:
+        # Zip central directories give entry counts and sizes up front, so
+        # an oversized batch is refused before anything is decompressed.
+        sizes = [await _measure_batch_file(file) for file in files]
+        if sum(count for count, _ in sizes) > settings.BATCH_MAX_FILES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Batch exceeds the {settings.BATCH_MAX_FILES} file limit",
+            )
+        if sum(size for _, size in sizes) > settings.BATCH_MAX_TOTAL_SIZE:
+            raise batch_too_large
+
+        budget = ByteBudget(settings.BATCH_MAX_TOTAL_SIZE)
+        spooled = await asyncio.gather(
+            *(_spool_batch_file(file, budget) for file in files),
+            return_exceptions=True,
+        )
+
+        for file, result in zip(files, spooled):
+            if isinstance(result, BaseException):
+                items.append({"filename": file.filename, "error": str(result)})
+            else:
+                items.extend(result)
+
+        if any(isinstance(result, BatchTooLargeError) for result in spooled):
+            raise batch_too_large
+
+        seen_hashes = set()
+        pending = []
+        for item in items:
+            if "error" in item:
+                item["status"] = "failed"
+            elif item["image_hash"] in seen_hashes:
+                item["status"] = "duplicate"
+            else:
+                seen_hashes.add(item["image_hash"])
+                pending.append(item)
+
+        existing_hashes = await find_existing_hashes(seen_hashes)
+        for item in pending:
+            if item["image_hash"] in existing_hashes:
+                item["status"] = "duplicate"
+        pending = [item for item in pending if "status" not in item]
+
+        stored_tags = await get_tagging_results(
+            [item["image_hash"] for item in pending], language
+        )
+        untagged = []
+        for item in pending:
+            if item["image_hash"] in stored_tags:
+                item["raw_tags"] = stored_tags[item["image_hash"]]
+            else:
+                untagged.append(item)
+
+        semaphore = asyncio.Semaphore(settings.BATCH_TAGGING_CONCURRENCY)
+        await asyncio.gather(
+            *(_tag_batch_item(item, semaphore, language) for item in untagged)
+        )
+        await cache_tagging_results(
+            {
+                item["image_hash"]: item["raw_tags"]
+                for item in untagged
+                if "raw_tags" in item
+            },
+            language,
+        )
+
+        tagged = []
+        for item in pending:
+            if "error" in item:
+                item["status"] = "failed"
+            else:
+                item["tags"] = get_optimal_tags(
+                    item["raw_tags"], confidence_threshold, language
                 )
-                session.add(db_tag)
+                tagged.append(item)
 
-            await session.commit()
+        if tagged:
+            tag_ids = await tag_dictionary.get_or_create(
+                [tag_data["tag_name"] for item in tagged for tag_data in item["tags"]],
+                language,
+            )
+            processed_date = datetime.now(timezone.utc)
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    insert(Image)
+                    .on_conflict_do_nothing(index_elements=["image_hash"])
+                    .returning(Image.id, Image.image_hash, Image.upload_date),
+                    [
+                        {
+                            "filename": item["filename"],
+                            "original_filename": item["filename"],
+                            "file_size": item["file_size"],
+                            "mime_type": item["content_type"],
+                            "image_hash": item["image_hash"],
+                            "perceptual_hash": item["perceptual_hash"],
+                            "processed_date": processed_date,
+                        }
+                        for item in tagged
+                    ],
+                )
+                inserted = {row.image_hash: row for row in result}
 
-            return {
-                "image_id": db_image.id,
-                "filename": file.filename,
-                "total_tags": len(optimal_tags),
-                "tags": optimal_tags,
-                "primary_tags": [tag for tag in optimal_tags if tag["is_primary"]],
-            }
+                tag_rows = []
+                upload_dates = {}
+                for item in tagged:
+                    if item["image_hash"] not in inserted:
+                        item["status"] = "duplicate"
+                        continue
+
+                    image_id = inserted[item["image_hash"]].id
+                    upload_dates[image_id] = inserted[item["image_hash"]].upload_date
+
+                    item["status"] = "created"
+                    item["image_id"] = image_id
+                    known_hashes.add(item["image_hash"])
+                    phash_index.add(image_id, item["perceptual_hash"])
+                    tag_rows.extend(
+                        build_tag_rows(image_id, item["tags"], tag_ids, language)
+                    )
+
+                await insert_image_tags(session, tag_rows)
+                await apply_tag_stats(
+                    session, tag_rows, upload_dates, new_images=True
+                )
+
+                await save_tagging_results(
+                    session,
+                    [
+                        {
+                            "image_hash": item["image_hash"],
+                            "language": language,
+                            "tags": item["raw_tags"],
+                        }
+                        for item in tagged
+                    ],
+                )
+
+                await session.commit()
+                await bump_data_generation()
+
+        results = []
+        for item in items:
+            entry = {"filename": item["filename"], "status": item["status"]}
+            if item["status"] == "created":
+                entry["image_id"] = item["image_id"]
+                entry["total_tags"] = len(item["tags"])
+            elif item["status"] == "failed":
+                entry["detail"] = item["error"]
+            results.append(entry)
+
+        return {
+            "total_files": len(results),
+            "created": sum(1 for entry in results if entry["status"] == "created"),
+            "duplicates": sum(
+                1 for entry in results if entry["status"] == "duplicate"
+            ),
+            "failed": sum(1 for entry in results if entry["status"] == "failed"),
+            "results": results,
+        }
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}")
+        logger.error(f"Error processing batch: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        close_spools(items)
+
+
+def _filter_images(
+    stmt,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    tag: Optional[str],
+):
+    if date_from is not None:
+        stmt = stmt.where(Image.upload_date >= date_from)
+    if date_to is not None:
+        stmt = stmt.where(Image.upload_date < date_to)
+    if tag is not None:
+        stmt = stmt.where(
+            exists().where(
+                ImageTag.image_id == Image.id,
+                ImageTag.tag_id == Tag.id,
+                Tag.name == tag,
+            )
+        )
+    return stmt
+
+
+def _image_summary(
+    image_id: int, filename: str, upload_date: Optional[datetime], tags: List[dict]
+) -> dict:
+    return {
+        "id": image_id,
+        "filename": filename,
+        "upload_date": upload_date,
+        "total_tags": len(tags),
+        "tags": tags,
+    }
+
+
+async def _stream_images_ndjson(stmt):
+    async with read_session() as session:
+        result = await session.stream(
+            stmt.execution_options(yield_per=settings.IMAGES_STREAM_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            tags = await load_image_tags(session, [row[0] for row in rows])
+            yield b"".join(
+                dumps(
+                    _image_summary(
+                        image_id, filename, upload_date, tags.get(image_id, [])
+                    )
+                )
+                + b"\n"
+                for image_id, filename, upload_date in rows
+            )
 
 
 @router.get("/images/")
-async def get_all_images():
-    async with async_session_maker() as session:
+async def get_all_images(
+    request: Request,
+    limit: int = Query(
+        settings.IMAGES_PAGE_SIZE, ge=1, le=settings.IMAGES_MAX_PAGE_SIZE
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor from the previous page"
+    ),
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    tag: Optional[str] = None,
+    format: Literal["json", "ndjson"] = Query(
+        "json", description="ndjson streams every matching image, ignoring limit"
+    ),
+):
+    try:
+        stmt = _filter_images(
+            select(Image.id, Image.filename, Image.upload_date).order_by(
+                Image.id.desc()
+            ),
+            date_from,
+            date_to,
+            tag,
+        )
+        if cursor is not None:
+            stmt = stmt.where(Image.id < decode_cursor(cursor))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Read before querying, so the page is at least as new as its ETag.
+    generation = await get_data_generation()
+    etag = make_etag("g", generation) if generation is not None else None
+    matched = matching_etag(request, etag)
+    if matched:
+        return not_modified(matched)
+
+    if format == "ndjson":
+        response = StreamingResponse(
+            _stream_images_ndjson(stmt), media_type="application/x-ndjson"
+        )
+        return with_cache_headers(response, etag)
+
+    async with read_session() as session:
         try:
-            result = await session.execute(select(Image))
-            images = result.scalars().all()
+            result = await session.execute(stmt.limit(limit + 1))
+            rows = result.all()
 
-            images_result = []
-            for image in images:
-                images_result.append(
-                    {
-                        "id": image.id,
-                        "filename": image.filename,
-                        "upload_date": image.upload_date,
-                        "total_tags": len(image.tags),
-                        "tags": [
-                            {
-                                "name": tag.tag_name,
-                                "confidence": tag.confidence,
-                                "is_primary": tag.is_primary,
-                            }
-                            for tag in image.tags
-                        ],
-                    }
-                )
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            tags = await load_image_tags(session, [row[0] for row in rows])
 
-            return {"images": images_result}
+            response = FastJSONResponse(
+                {
+                    "images": [
+                        _image_summary(
+                            image_id, filename, upload_date, tags.get(image_id, [])
+                        )
+                        for image_id, filename, upload_date in rows
+                    ],
+                    "next_cursor": encode_cursor(rows[-1][0]) if has_more else None,
+                }
+            )
+            return with_cache_headers(response, etag)
 
         except Exception as e:
             logger.error(f"Error getting images: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
 
+def _parse_search_terms(values: List[str], min_confidence: float) -> List[tuple]:
+    terms = {}
+    for value in values:
+        tag_name, _, threshold = value.partition(":")
+        if not tag_name:
+            raise ValueError(value)
+        terms[tag_name] = float(threshold) if threshold else min_confidence
+    return list(terms.items())
+
+
+@router.get("/search")
+async def search_images(
+    all_tags: List[str] = Query(
+        [],
+        alias="all",
+        description="Tags every image must have, as name or name:min_confidence",
+    ),
+    any_tags: List[str] = Query(
+        [], alias="any", description="Tags of which an image needs at least one"
+    ),
+    none_tags: List[str] = Query(
+        [], alias="none", description="Tags an image must not have"
+    ),
+    min_confidence: float = 0.0,
+    limit: int = Query(
+        settings.IMAGES_PAGE_SIZE, ge=1, le=settings.IMAGES_MAX_PAGE_SIZE
+    ),
+    offset: int = Query(0, ge=0),
+):
+    try:
+        all_terms = _parse_search_terms(all_tags, min_confidence)
+        any_terms = _parse_search_terms(any_tags, min_confidence)
+        none_terms = _parse_search_terms(none_tags, min_confidence)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid tag filter")
+
+    required_names = {tag_name for tag_name, _ in all_terms}
+    any_terms = [term for term in any_terms if term[0] not in required_names]
+    if not all_terms and not any_terms:
+        raise HTTPException(
+            status_code=400, detail="At least one 'all' or 'any' tag is required"
+        )
+
+    async with read_session() as session:
+        try:
+            tag_names = [term[0] for term in all_terms + any_terms + none_terms]
+            if posting_cache.covers(tag_names):
+                image_ids, scores = posting_cache.search(
+                    all_terms, any_terms, none_terms
+                )
+                ranked = list(
+                    zip(
+                        image_ids[offset : offset + limit].tolist(),
+                        scores[offset : offset + limit].tolist(),
+                    )
+                )
+            else:
+                ranked = await search_tags_sql(
+                    session, all_terms, any_terms, none_terms, limit, offset
+                )
+
+            image_ids = [image_id for image_id, _ in ranked]
+            rows = {}
+            if image_ids:
+                result = await session.execute(
+                    select(Image.id, Image.filename, Image.upload_date).where(
+                        Image.id.in_(image_ids)
+                    )
+                )
+                rows = {row[0]: row for row in result}
+            tags = await load_image_tags(session, image_ids)
+
+            images = []
+            for image_id, score in ranked:
+                if image_id in rows:
+                    image = _image_summary(*rows[image_id], tags.get(image_id, []))
+                    image["score"] = round(score, 2)
+                    images.append(image)
+
+            return FastJSONResponse(
+                {"images": images, "limit": limit, "offset": offset}
+            )
+
+        except Exception as e:
+            logger.error(f"Error searching images: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+def _image_etag(image_id: int, processed_date: Optional[datetime]) -> str:
+    # Retagging bumps processed_date, so it versions the image and its tags.
+    version = int(processed_date.timestamp() * 1_000_000) if processed_date else 0
+    return make_etag("i", image_id, version)
+
+
 @router.get("/images/{image_id}")
-async def get_image(image_id: int):
+async def get_image(request: Request, image_id: int):
     async with async_session_maker() as session:
+        if request.headers.get("if-none-match"):
+            result = await session.execute(
+                select(Image.processed_date).where(Image.id == image_id)
+            )
+            version = result.one_or_none()
+            if version is not None:
+                matched = matching_etag(request, _image_etag(image_id, version[0]))
+                if matched:
+                    return not_modified(matched)
+
         try:
-            result = await session.execute(select(Image).where(Image.id == image_id))
-            image = result.scalar_one_or_none()
+            result = await session.execute(
+                select(
+                    Image.filename,
+                    Image.upload_date,
+                    Image.file_size,
+                    Image.mime_type,
+                    Image.processed_date,
+                ).where(Image.id == image_id)
+            )
+            image = result.one_or_none()
 
             if not image:
                 raise HTTPException(status_code=404, detail="Image not found")
 
+            filename, upload_date, file_size, mime_type, processed_date = image
+            tags = await load_image_tags(session, [image_id])
+            response = FastJSONResponse(
+                {
+                    "image": {
+                        "id": image_id,
+                        "filename": filename,
+                        "upload_date": upload_date,
+                        "file_size": file_size,
+                        "mime_type": mime_type,
+                    },
+                    "tags": tags.get(image_id, []),
+                }
+            )
+            return with_cache_headers(
+                response, _image_etag(image_id, processed_date)
+            )
+
+        except Exception as e:
+            logger.error(f"Error getting image: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/images/{image_id}/similar")
+async def get_similar(image_id: int, max_distance: int = Query(10, ge=0, le=16)):
+    async with async_session_maker() as session:
+        try:
+            result = await session.execute(
+                select(Image.perceptual_hash).where(Image.id == image_id)
+            )
+            row = result.one_or_none()
+
+            if not row:
+                raise HTTPException(status_code=404, detail="Image not found")
+            if row.perceptual_hash is None:
+                raise HTTPException(
+                    status_code=404, detail="Image has no perceptual hash"
+                )
+
+            similar = [
+                (similar_id, distance)
+                for similar_id, distance in await get_similar_images(
+                    row.perceptual_hash, max_distance
+                )
+                if similar_id != image_id
+            ]
+
+            images = {}
+            if similar:
+                result = await session.execute(
+                    select(Image.id, Image.filename, Image.upload_date).where(
+                        Image.id.in_([similar_id for similar_id, _ in similar])
+                    )
+                )
+                images = {image.id: image for image in result}
+
             return {
-                "image": {
-                    "id": image.id,
-                    "filename": image.filename,
-                    "upload_date": image.upload_date,
-                    "file_size": image.file_size,
-                    "mime_type": image.mime_type,
-                },
-                "tags": [
+                "image_id": image_id,
+                "max_distance": max_distance,
+                "similar_images": [
                     {
-                        "name": tag.tag_name,
-                        "confidence": tag.confidence,
-                        "is_primary": tag.is_primary,
+                        "id": similar_id,
+                        "filename": images[similar_id].filename,
+                        "upload_date": images[similar_id].upload_date,
+                        "distance": distance,
                     }
-                    for tag in image.tags
+                    for similar_id, distance in similar
+                    if similar_id in images
                 ],
             }
 
+        except HTTPException:
+            raise
         except Exception as e:
-            logger.error(f"Error getting image: {str(e)}")
+            logger.error(f"Error finding similar images: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/images/{image_id}/retag")
+async def retag_image(
+    image_id: int, confidence_threshold: float = 30.0, language: str = "en"
+):
+    async with async_session_maker() as session:
+        try:
+            result = await session.execute(
+                select(Image.filename, Image.image_hash, Image.upload_date).where(
+                    Image.id == image_id
+                )
+            )
+            image = result.one_or_none()
+
+            if not image:
+                raise HTTPException(status_code=404, detail="Image not found")
+
+            raw_tags = await get_tagging_result(image.image_hash, language)
+            if raw_tags is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No stored tagging result for language '{language}'",
+                )
+
+            optimal_tags = get_optimal_tags(raw_tags, confidence_threshold, language)
+            tag_ids = await tag_dictionary.get_or_create(
+                [tag_data["tag_name"] for tag_data in optimal_tags], language
+            )
+
+            result = await session.execute(
+                delete(ImageTag)
+                .where(ImageTag.image_id == image_id, ImageTag.tag_id == Tag.id)
+                .returning(
+                    ImageTag.image_id,
+                    Tag.name.label("tag_name"),
+                    ImageTag.confidence,
+                )
+            )
+            upload_dates = {image_id: image.upload_date}
+            await apply_tag_stats(
+                session, [row._asdict() for row in result], upload_dates, sign=-1
+            )
+
+            tag_rows = build_tag_rows(image_id, optimal_tags, tag_ids, language)
+            await insert_image_tags(session, tag_rows)
+            await apply_tag_stats(session, tag_rows, upload_dates)
+            await session.execute(
+                update(Image)
+                .where(Image.id == image_id)
+                .values(processed_date=datetime.now(timezone.utc))
+            )
+            await session.commit()
+            await bump_data_generation()
+
+            return {
+                "image_id": image_id,
+                "filename": image.filename,
+                "total_tags": len(optimal_tags),
+                "tags": optimal_tags,
+                "primary_tags": [tag for tag in optimal_tags if tag["is_primary"]],
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error retagging image: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
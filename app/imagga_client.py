@@ -0,0 +1,361 @@
+import aiohttp
+import asyncio
+import io
+import logging
+import time
+
+from typing import Dict, Optional
+
+from app.config import settings
+from app.metrics import IMAGGA_REQUEST_DURATION
+from app.redis_client import reserve_token
+from app.utils import jittered_backoff
+
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_KEY = "imagga_rate_limit"
+
+
+class ImaggaAPIError(Exception):
+    def __init__(self, status: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def is_retryable(status: int) -> bool:
+    return status == 429 or status >= 500
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class _FileView(io.RawIOBase):
+    """Reads an image file for one request without letting aiohttp close it.
+
+    aiohttp closes file payloads once they are sent, but retries and the
+    other callers sharing a call still read the same file.
+    """
+
+    def __init__(self, image):
+        self._image = image
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._image.read(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._image.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._image.tell()
+
+    def fileno(self) -> int:
+        return self._image.fileno()
+
+
+class TokenBucket:
+    """In-process twin of the Redis token bucket, used while Redis is down."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self, max_wait: float) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        if wait <= max_wait:
+            self.tokens -= 1
+        return wait
+
+
+class CircuitBreaker:
+    """Fail fast after consecutive failures, then let one probe through.
+
+    Opens after ``failure_threshold`` failures in a row and rejects calls for
+    ``reset_timeout`` seconds. After that it is half-open: a single call is
+    let through, and its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_started: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "closed" or self.failure_threshold <= 0:
+            return
+
+        now = time.monotonic()
+        # A probe that never reported back (e.g. cancelled) must not wedge
+        # the circuit half-open forever.
+        if state == "half_open" and (
+            self.probe_started is None
+            or now - self.probe_started > self.reset_timeout
+        ):
+            self.probe_started = now
+            return
+
+        retry_after = max(self.opened_at + self.reset_timeout - now, 1.0)
+        raise ImaggaAPIError(
+            503, "Imagga API unavailable, circuit open", retry_after=retry_after
+        )
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Imagga circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(
+                    f"Imagga circuit open for {self.reset_timeout}s "
+                    f"after {self.failures} failures"
+                )
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+
+class ImaggaClient:
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.breaker = CircuitBreaker(
+            settings.IMAGGA_BREAKER_FAILURES, settings.IMAGGA_BREAKER_RESET_TIMEOUT
+        )
+        self._local_bucket = TokenBucket(
+            settings.IMAGGA_RATE_LIMIT, settings.IMAGGA_RATE_BURST
+        )
+
+    async def start(self):
+        if self._session is not None:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.IMAGGA_POOL_LIMIT,
+            limit_per_host=settings.IMAGGA_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.IMAGGA_DNS_CACHE_TTL,
+            keepalive_timeout=settings.IMAGGA_KEEPALIVE_TIMEOUT,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None,
+            connect=settings.IMAGGA_CONNECT_TIMEOUT,
+            sock_read=settings.IMAGGA_READ_TIMEOUT,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            auth=aiohttp.BasicAuth(settings.IMAGGA_API_KEY, settings.IMAGGA_API_SECRET),
+        )
+        logger.info(
+            f"Imagga client started (limit={settings.IMAGGA_POOL_LIMIT}, "
+            f"per_host={settings.IMAGGA_POOL_LIMIT_PER_HOST})"
+        )
+
+    async def close(self):
+        if self._session is None:
+            return
+
+        await self._session.close()
+        self._session = None
+
+    async def _acquire_token(self) -> None:
+        if settings.IMAGGA_RATE_LIMIT <= 0:
+            return
+
+        max_wait = settings.IMAGGA_RATE_LIMIT_MAX_WAIT
+        wait = await reserve_token(
+            RATE_LIMIT_KEY,
+            settings.IMAGGA_RATE_LIMIT,
+            settings.IMAGGA_RATE_BURST,
+            max_wait,
+        )
+        if wait is None:
+            # Without Redis each worker gets the whole budget to itself.
+            wait = self._local_bucket.reserve(max_wait)
+
+        if wait > max_wait:
+            raise ImaggaAPIError(
+                429, "Tagging rate limit exceeded", retry_after=wait - max_wait
+            )
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _post(
+        self, image, filename: str, content_type: str, language: str
+    ) -> dict:
+        if hasattr(image, "read"):
+            image = _FileView(image)
+        form_data = aiohttp.FormData()
+        form_data.add_field(
+            "image",
+            image,
+            filename=filename,
+            content_type=content_type,
+        )
+
+        started = time.perf_counter()
+        status = "error"
+        try:
+            async with self._session.post(
+                settings.IMAGGA_API_URL,
+                data=form_data,
+                params={"language": language},
+            ) as response:
+                status = str(response.status)
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ImaggaAPIError(
+                        response.status,
+                        error_text,
+                        retry_after=_parse_retry_after(
+                            response.headers.get("Retry-After")
+                        ),
+                    )
+
+                return await response.json()
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        finally:
+            IMAGGA_REQUEST_DURATION.labels(status).observe(
+                time.perf_counter() - started
+            )
+
+    async def _tag_with_retries(
+        self, image, filename: str, content_type: str, language: str
+    ) -> dict:
+        start = image.tell() if hasattr(image, "seek") else None
+
+        for attempt in range(settings.IMAGGA_MAX_RETRIES + 1):
+            last_attempt = attempt == settings.IMAGGA_MAX_RETRIES
+            self.breaker.before_call()
+            await self._acquire_token()
+            if start is not None:
+                image.seek(start)
+
+            try:
+                data = await self._post(image, filename, content_type, language)
+            except ImaggaAPIError as e:
+                # A 429 or 4xx still means the API is up.
+                if e.status >= 500:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                if not is_retryable(e.status) or last_attempt:
+                    raise
+                error, retry_after = f"status {e.status}", e.retry_after or 0.0
+            except aiohttp.ConnectionTimeoutError as e:
+                # Also a TimeoutError, but nothing reached Imagga yet, so it's
+                # retried like any other failed connection.
+                self.breaker.record_failure()
+                if last_attempt:
+                    raise
+                error, retry_after = f"connect timeout {e}", 0.0
+            except asyncio.TimeoutError:
+                # Read timeouts already took IMAGGA_READ_TIMEOUT; don't repeat them.
+                self.breaker.record_failure()
+                raise
+            except aiohttp.ClientConnectionError as e:
+                self.breaker.record_failure()
+                if last_attempt:
+                    raise
+                error, retry_after = str(e), 0.0
+            else:
+                self.breaker.record_success()
+                return data
+
+            delay = max(
+                retry_after,
+                jittered_backoff(
+                    attempt,
+                    settings.IMAGGA_RETRY_BACKOFF,
+                    settings.IMAGGA_RETRY_BACKOFF_MAX,
+                ),
+            )
+            logger.warning(
+                f"Imagga request failed ({error}), retrying in {delay:.2f}s"
+            )
+            await asyncio.sleep(delay)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the outcome retrieved even if every waiter went away.
+        if not task.cancelled():
+            task.exception()
+
+    async def tag_image(
+        self,
+        image,
+        filename: str,
+        content_type: str,
+        language: str = "en",
+        key: Optional[str] = None,
+    ) -> dict:
+        """Tag an image, sharing one API call among concurrent callers with ``key``."""
+        if self._session is None:
+            raise RuntimeError("Imagga client is not started")
+
+        if key is None:
+            return await self._tag_with_retries(image, filename, content_type, language)
+
+        key = f"{key}:{language}"
+        task = self._in_flight.get(key)
+        if task is not None:
+            # One caller going away must not cancel the call for the others.
+            return await asyncio.shield(task)
+
+        task = asyncio.create_task(
+            self._tag_with_retries(image, filename, content_type, language)
+        )
+        self._in_flight[key] = task
+        task.add_done_callback(lambda done: self._forget(key, done))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # The call reads this caller's image, which the caller closes once
+            # it returns; hold on to it until the other waiters are served.
+            while not task.done():
+                try:
+                    await asyncio.wait({task})
+                except asyncio.CancelledError:
+                    pass
+            raise
+
+
+imagga_client = ImaggaClient()
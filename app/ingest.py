@@ -0,0 +1,137 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.analytics_cache import bump_data_generation
+from app.hash_filter import known_hashes
+from app.models import Image, ImageTag
+from app.phash_index import phash_index
+from app.rollups import apply_tag_stats
+from app.tag_dictionary import tag_dictionary
+from app.tagging_backends import tagging_backend
+from app.tagging_store import (
+    cache_tagging_result,
+    get_tagging_result,
+    save_tagging_results,
+)
+from app.utils import get_optimal_tags
+
+
+class DuplicateImageError(Exception):
+    pass
+
+
+def build_tag_rows(
+    image_id: int, tags: List[dict], tag_ids: Dict[str, int], language: str
+) -> List[dict]:
+    return [
+        {
+            "image_id": image_id,
+            "tag_id": tag_ids[tag_data["tag_name"]],
+            "tag_name": tag_data["tag_name"],
+            "confidence": tag_data["confidence"],
+            "language": language,
+            "is_primary": tag_data["is_primary"],
+        }
+        for tag_data in tags
+    ]
+
+
+async def insert_image_tags(session: AsyncSession, tag_rows: List[dict]) -> None:
+    # tag_name rides along for the rollups; image_tags only stores the id.
+    if tag_rows:
+        await session.execute(
+            insert(ImageTag),
+            [
+                {key: value for key, value in row.items() if key != "tag_name"}
+                for row in tag_rows
+            ],
+        )
+
+
+async def fetch_tags(
+    image_hash: str, image, filename: str, content_type: str, language: str
+) -> List[dict]:
+    """Raw Imagga tags for an image, from the stored results when possible."""
+    raw_tags = await get_tagging_result(image_hash, language)
+    if raw_tags is None:
+        imagga_data = await tagging_backend.tag_image(
+            image,
+            filename=filename,
+            content_type=content_type,
+            language=language,
+            key=image_hash,
+        )
+        raw_tags = imagga_data["result"]["tags"]
+        await cache_tagging_result(image_hash, language, raw_tags)
+    return raw_tags
+
+
+async def store_image(
+    session: AsyncSession,
+    *,
+    filename: str,
+    content_type: str,
+    file_size: int,
+    image_hash: str,
+    perceptual_hash: Optional[int],
+    raw_tags: List[dict],
+    confidence_threshold: float,
+    language: str,
+) -> dict:
+    """Insert an image with its tags and rollups; the caller commits.
+
+    Once committed, pass the result to ``image_stored``.
+    """
+    optimal_tags = get_optimal_tags(raw_tags, confidence_threshold, language)
+    tag_ids = await tag_dictionary.get_or_create(
+        [tag_data["tag_name"] for tag_data in optimal_tags], language
+    )
+
+    result = await session.execute(
+        insert(Image)
+        .values(
+            filename=filename,
+            original_filename=filename,
+            file_size=file_size,
+            mime_type=content_type,
+            image_hash=image_hash,
+            perceptual_hash=perceptual_hash,
+            processed_date=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["image_hash"])
+        .returning(Image.id, Image.upload_date)
+    )
+    inserted = result.one_or_none()
+    if inserted is None:
+        raise DuplicateImageError(image_hash)
+    image_id = inserted.id
+
+    tag_rows = build_tag_rows(image_id, optimal_tags, tag_ids, language)
+    await insert_image_tags(session, tag_rows)
+    await apply_tag_stats(
+        session, tag_rows, {image_id: inserted.upload_date}, new_images=True
+    )
+
+    await save_tagging_results(
+        session,
+        [{"image_hash": image_hash, "language": language, "tags": raw_tags}],
+    )
+
+    return {
+        "image_id": image_id,
+        "filename": filename,
+        "total_tags": len(optimal_tags),
+        "tags": optimal_tags,
+        "primary_tags": [tag for tag in optimal_tags if tag["is_primary"]],
+    }
+
+
+async def image_stored(
+    image_id: int, image_hash: str, perceptual_hash: Optional[int]
+) -> None:
+    known_hashes.add(image_hash)
+    phash_index.add(image_id, perceptual_hash)
+    await bump_data_generation()
@@ -0,0 +1,417 @@
+"""Postgres-backed tagging job queue for asynchronous uploads.
+
+Workers claim jobs with ``FOR UPDATE SKIP LOCKED``, so any number of them
+can run across processes. Each API process runs ``JOB_WORKERS`` of them;
+set it to 0 and run ``python -m app.jobs`` to tag in separate processes.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import uuid
+
+from datetime import timedelta
+from typing import BinaryIO, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import defer
+
+from app.config import settings
+from app.database import async_session_maker
+from app.imagga_client import ImaggaAPIError
+from app.ingest import DuplicateImageError, fetch_tags, image_stored, store_image
+from app.models import TaggingJob
+from app.redis_client import close_redis, init_redis
+from app.tagging_backends import tagging_backend
+from app.utils import jittered_backoff
+
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("queued", "running")
+FINISHED_STATUSES = ("done", "failed", "dead")
+
+
+def job_status(job: TaggingJob) -> dict:
+    return jsonable_encoder(
+        {
+            "job_id": job.id,
+            "status": job.status,
+            "filename": job.filename,
+            "attempts": job.attempts,
+            "image_id": job.image_id,
+            "result": json.loads(job.result_json) if job.result_json else None,
+            "detail": job.last_error,
+            "created_date": job.created_date,
+            "finished_date": job.finished_date,
+        }
+    )
+
+
+def _payload_file(image_path: str) -> str:
+    return os.path.join(settings.JOB_PAYLOAD_DIR, image_path)
+
+
+def save_payload(image: BinaryIO) -> str:
+    """Copy an upload into JOB_PAYLOAD_DIR in chunks; the new file's name."""
+    os.makedirs(settings.JOB_PAYLOAD_DIR, exist_ok=True)
+    image_path = uuid.uuid4().hex
+    image.seek(0)
+    with open(_payload_file(image_path), "wb") as payload:
+        shutil.copyfileobj(image, payload, settings.UPLOAD_CHUNK_SIZE)
+    return image_path
+
+
+def load_payload(job: TaggingJob):
+    # Handed to the tagging backend the way spool_payload does for uploads.
+    if job.image_path is None:
+        return job.image_data
+    payload = open(_payload_file(job.image_path), "rb")
+    if job.file_size > settings.UPLOAD_SPOOL_THRESHOLD:
+        return payload
+    with payload:
+        return payload.read()
+
+
+def remove_payload(image_path: Optional[str]) -> None:
+    if image_path is None:
+        return
+    try:
+        os.remove(_payload_file(image_path))
+    except FileNotFoundError:
+        pass
+
+
+async def enqueue_job(
+    *,
+    filename: str,
+    content_type: str,
+    file_size: int,
+    image_hash: str,
+    perceptual_hash: Optional[int],
+    image: BinaryIO,
+    confidence_threshold: float,
+    language: str,
+) -> TaggingJob:
+    """Queue an image for tagging, or return the active job for the same image."""
+    image_path = await asyncio.to_thread(save_payload, image)
+    try:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(TaggingJob)
+                .options(defer(TaggingJob.image_data))
+                .where(
+                    TaggingJob.image_hash == image_hash,
+                    TaggingJob.language == language,
+                    TaggingJob.status.in_(ACTIVE_STATUSES),
+                )
+                .limit(1)
+            )
+            job = result.scalar_one_or_none()
+            if job is None:
+                job = TaggingJob(
+                    filename=filename,
+                    content_type=content_type,
+                    file_size=file_size,
+                    image_hash=image_hash,
+                    perceptual_hash=perceptual_hash,
+                    image_path=image_path,
+                    confidence_threshold=confidence_threshold,
+                    language=language,
+                )
+                session.add(job)
+                await session.commit()
+    except BaseException:
+        remove_payload(image_path)
+        raise
+
+    if job.image_path != image_path:
+        # Already queued; that job has its own copy of the image.
+        await asyncio.to_thread(remove_payload, image_path)
+        return job
+
+    job_workers.notify()
+    return job
+
+
+async def get_job(job_id: int) -> Optional[TaggingJob]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(TaggingJob)
+            .options(defer(TaggingJob.image_data))
+            .where(TaggingJob.id == job_id)
+        )
+        return result.scalar_one_or_none()
+
+
+async def list_jobs(status: str, limit: int) -> List[TaggingJob]:
+    async with async_session_maker() as session:
+        result = await session.execute(
+            select(TaggingJob)
+            .options(defer(TaggingJob.image_data))
+            .where(TaggingJob.status == status)
+            .order_by(TaggingJob.id.desc())
+            .limit(limit)
+        )
+        return list(result.scalars())
+
+
+async def requeue_job(job_id: int) -> Optional[TaggingJob]:
+    """Move a dead-lettered job back onto the queue with fresh attempts."""
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(TaggingJob)
+            .where(TaggingJob.id == job_id, TaggingJob.status == "dead")
+            .values(
+                status="queued",
+                attempts=0,
+                available_at=func.now(),
+                finished_date=None,
+            )
+            .returning(TaggingJob.id)
+        )
+        requeued = result.scalar_one_or_none()
+        await session.commit()
+
+    if requeued is None:
+        return None
+    job_workers.notify()
+    return await get_job(job_id)
+
+
+async def claim_job() -> Optional[TaggingJob]:
+    """Lease the next due job for ``JOB_VISIBILITY_TIMEOUT`` seconds.
+
+    A running job whose lease ran out (its worker died or hung) is due
+    again and gets picked up by the next claim.
+    """
+    candidate = (
+        select(TaggingJob.id)
+        .where(
+            TaggingJob.status.in_(ACTIVE_STATUSES),
+            TaggingJob.available_at <= func.now(),
+        )
+        .order_by(TaggingJob.available_at, TaggingJob.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(TaggingJob)
+            .where(TaggingJob.id == candidate)
+            .values(
+                status="running",
+                attempts=TaggingJob.attempts + 1,
+                available_at=func.now()
+                + timedelta(seconds=settings.JOB_VISIBILITY_TIMEOUT),
+            )
+            .returning(TaggingJob)
+            .execution_options(synchronize_session=False)
+        )
+        job = result.scalar_one_or_none()
+        await session.commit()
+        return job
+
+
+def _lease(job: TaggingJob) -> tuple:
+    # A worker whose lease expired must not overwrite the job's new owner.
+    return (
+        TaggingJob.id == job.id,
+        TaggingJob.status == "running",
+        TaggingJob.attempts == job.attempts,
+    )
+
+
+async def _finish(job: TaggingJob, status: str, error: str) -> None:
+    # Dead jobs keep their image so they can be requeued.
+    keep_image = status == "dead"
+    async with async_session_maker() as session:
+        result = await session.execute(
+            update(TaggingJob)
+            .where(*_lease(job))
+            .values(
+                status=status,
+                last_error=error,
+                image_path=TaggingJob.image_path if keep_image else None,
+                image_data=TaggingJob.image_data if keep_image else None,
+                finished_date=func.now(),
+            )
+        )
+        await session.commit()
+
+    if result.rowcount and not keep_image:
+        await asyncio.to_thread(remove_payload, job.image_path)
+
+
+async def _retry(job: TaggingJob, error: str, retry_after: float = 0.0) -> None:
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        logger.error(f"Tagging job {job.id} dead-lettered: {error}")
+        await _finish(job, "dead", error)
+        return
+
+    delay = max(
+        retry_after,
+        jittered_backoff(
+            job.attempts - 1,
+            settings.JOB_RETRY_BACKOFF,
+            settings.JOB_RETRY_BACKOFF_MAX,
+        ),
+    )
+    logger.warning(f"Tagging job {job.id} failed, retrying in {delay:.1f}s: {error}")
+    async with async_session_maker() as session:
+        await session.execute(
+            update(TaggingJob)
+            .where(*_lease(job))
+            .values(
+                status="queued",
+                last_error=error,
+                available_at=func.now() + timedelta(seconds=delay),
+            )
+        )
+        await session.commit()
+
+
+async def _complete(job: TaggingJob) -> None:
+    image = await asyncio.to_thread(load_payload, job)
+    try:
+        raw_tags = await fetch_tags(
+            job.image_hash, image, job.filename, job.content_type, job.language
+        )
+    finally:
+        if hasattr(image, "close"):
+            image.close()
+
+    async with async_session_maker() as session:
+        response = await store_image(
+            session,
+            filename=job.filename,
+            content_type=job.content_type,
+            file_size=job.file_size,
+            image_hash=job.image_hash,
+            perceptual_hash=job.perceptual_hash,
+            raw_tags=raw_tags,
+            confidence_threshold=job.confidence_threshold,
+            language=job.language,
+        )
+        # Same transaction as the image, so a job is never done twice.
+        result = await session.execute(
+            update(TaggingJob)
+            .where(*_lease(job))
+            .values(
+                status="done",
+                image_id=response["image_id"],
+                result_json=json.dumps(response),
+                image_path=None,
+                image_data=None,
+                last_error=None,
+                finished_date=func.now(),
+            )
+        )
+        if result.rowcount == 0:
+            logger.warning(f"Tagging job {job.id} lost its lease, discarding result")
+            await session.rollback()
+            return
+        await session.commit()
+
+    await asyncio.to_thread(remove_payload, job.image_path)
+    await image_stored(response["image_id"], job.image_hash, job.perceptual_hash)
+
+
+async def process_job(job: TaggingJob) -> None:
+    try:
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            await _finish(
+                job, "dead", job.last_error or "Visibility timeout expired"
+            )
+            return
+        await _complete(job)
+    except DuplicateImageError:
+        await _finish(job, "failed", "Duplicate image already exists")
+    except FileNotFoundError:
+        # JOB_PAYLOAD_DIR is not shared with the process that queued it.
+        await _finish(job, "failed", "Queued image file is missing")
+    except ImaggaAPIError as e:
+        error = f"Imagga API error: {e.detail}"
+        if e.status == 429 or e.status >= 500:
+            await _retry(job, error, e.retry_after or 0.0)
+        else:
+            await _finish(job, "failed", error)
+    except asyncio.TimeoutError:
+        await _retry(job, "Imagga API timed out")
+    except Exception as e:
+        logger.error(f"Error processing tagging job {job.id}: {str(e)}")
+        await _retry(job, str(e))
+
+
+class JobWorkers:
+    def __init__(self):
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                job = await claim_job()
+                if job is not None:
+                    await process_job(job)
+                    continue
+            except Exception as e:
+                logger.error(f"Error claiming tagging job: {str(e)}")
+
+            # Enqueues in this process wake us early; others are polled.
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), settings.JOB_POLL_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self, workers: Optional[int] = None) -> None:
+        if workers is None:
+            workers = settings.JOB_WORKERS
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(workers)]
+
+    async def stop(self) -> None:
+        # Jobs cut off here become visible again once their lease runs out.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+job_workers = JobWorkers()
+
+
+async def run_workers(workers: int) -> None:
+    await init_redis()
+    await tagging_backend.start()
+    job_workers.start(workers)
+    logger.info(f"Started {workers} tagging job workers")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_workers.stop()
+        await tagging_backend.close()
+        await close_redis()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=max(settings.JOB_WORKERS, 1))
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run_workers(args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.config import settings
+from app.jobs import (
+    FINISHED_STATUSES,
+    get_job,
+    job_status,
+    list_jobs,
+    requeue_job,
+)
+
+
+router = APIRouter(
+    prefix="/image/jobs",
+    tags=["Задачи"],
+)
+
+
+@router.get("/")
+async def get_jobs(
+    status: Literal["queued", "running", "done", "failed", "dead"] = Query(
+        "dead", description="dead lists the dead-letter queue"
+    ),
+    limit: int = Query(50, ge=1, le=500),
+):
+    jobs = await list_jobs(status, limit)
+    return {"jobs": [job_status(job) for job in jobs]}
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: int):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+async def _job_events(job_id: int):
+    last_event = None
+    while True:
+        job = await get_job(job_id)
+        if job is None:
+            yield 'event: error\ndata: {"detail": "Job not found"}\n\n'
+            return
+
+        event = job_status(job)
+        if event != last_event:
+            yield f"event: {job.status}\ndata: {json.dumps(event)}\n\n"
+            last_event = event
+
+        if job.status in FINISHED_STATUSES:
+            return
+        await asyncio.sleep(settings.JOB_EVENTS_POLL_INTERVAL)
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: int):
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return StreamingResponse(
+        _job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/{job_id}/retry")
+async def retry_job(job_id: int):
+    job = await requeue_job(job_id)
+    if job is not None:
+        return job_status(job)
+
+    if await get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    raise HTTPException(status_code=409, detail="Only dead jobs can be retried")
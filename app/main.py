@@ -1,12 +1,53 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
 from app.analytics_router import router as analytics_router
+from app.compression import CompressionMiddleware
+from app.database import dispose_engines, warm_up_pools
+from app.hash_filter import known_hashes
 from app.images_router import router as images_router
+from app.jobs import job_workers
+from app.jobs_router import router as jobs_router
+from app.metrics import MetricsMiddleware
+from app.metrics import router as metrics_router
+from app.phash_index import phash_index
+from app.profiling import ProfilingMiddleware
+from app.profiling import router as profiling_router
+from app.responses import FastJSONResponse
+from app.redis_client import close_redis, init_redis
+from app.sample_catalog import sample_catalog
 from app.sample_images_router import router as sample_router
+from app.tagging_backends import tagging_backend
+from app.tag_index import posting_cache
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_up_pools()
+    await init_redis()
+    await known_hashes.load()
+    await phash_index.load()
+    await sample_catalog.load()
+    await tagging_backend.start()
+    posting_cache.start()
+    job_workers.start()
+    yield
+    await job_workers.stop()
+    await posting_cache.stop()
+    await tagging_backend.close()
+    await close_redis()
+    await dispose_engines()
 
-app = FastAPI(title="Image Tagging API", version="1.0.0")
+
+app = FastAPI(
+    title="Image Tagging API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,9 +60,15 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(analytics_router)
 app.include_router(images_router)
+app.include_router(jobs_router)
+app.include_router(metrics_router)
+app.include_router(profiling_router)
 app.include_router(sample_router)
 
 # app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -33,9 +80,22 @@ async def root():
         "message": "Image Tagging API",
         "endpoints": {
             "upload_image": "POST image/upload/",
+            "upload_images_batch": "POST image/upload-batch/",
+            "tagging_job": "GET image/jobs/{job_id}",
+            "tagging_job_events": "GET image/jobs/{job_id}/events",
+            "dead_letter_jobs": "GET image/jobs/?status=dead",
             "top_tags_analytics": "GET /analytics/top-tags/",
             "overall_stats": "GET /analytics/stats/",
+            "tag_cooccurrence": "GET /analytics/co-occurrence/",
+            "top_tag_pairs": "GET /analytics/co-occurrence/pairs/",
+            "tag_trends": "GET /analytics/trends/",
+            "analytics_cache_stats": "GET /analytics/cache-stats/",
             "list_images": "GET /images/",
             "get_image": "GET /images/{image_id}",
+            "retag_image": "POST image/images/{image_id}/retag",
+            "similar_images": "GET image/images/{image_id}/similar",
+            "search_images": "GET image/search",
+            "metrics": "GET /metrics",
+            "request_profiles": "GET /admin/profiles/",
         },
     }
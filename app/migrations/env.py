@@ -11,7 +11,20 @@ sys.path.insert(0, dirname(dirname(dirname(abspath(__file__)))))
 
 from app.config import settings
 from app.database import Base
-from app.models import Image, ImageTag, SampleImage
+from app.models import (
+    GlobalStat,
+    Image,
+    ImageTag,
+    SampleImage,
+    Tag,
+    TagConfidenceBucket,
+    TagCooccurrence,
+    TagHourStat,
+    TaggingJob,
+    TaggingResult,
+    TagStat,
+    UploadHourStat,
+)
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,78 @@
+"""dictionary encode tag names
+
+Revision ID: fc2788ea5f8b
+Revises: 5c7e5bfd72cd
+Create Date: 2026-10-17 01:22:19.854274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc2788ea5f8b'
+down_revision: Union[str, Sequence[str], None] = '5c7e5bfd72cd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('tags',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('language', sa.String(length=10), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name', 'language', name='uq_tag_name_language')
+    )
+    op.execute(
+        """
+        INSERT INTO tags (name, language)
+        SELECT DISTINCT tag_name, coalesce(language, 'en')
+        FROM image_tags
+        ORDER BY 1, 2
+        """
+    )
+
+    op.add_column('image_tags', sa.Column('tag_id', sa.Integer(), nullable=True))
+    op.execute(
+        """
+        UPDATE image_tags
+        SET tag_id = tags.id
+        FROM tags
+        WHERE tags.name = image_tags.tag_name
+          AND tags.language = coalesce(image_tags.language, 'en')
+        """
+    )
+    op.alter_column('image_tags', 'tag_id', nullable=False)
+
+    op.drop_index(op.f('ix_image_tags_tag_name_confidence_image_id'), table_name='image_tags')
+    op.drop_constraint(op.f('uq_image_tag'), 'image_tags', type_='unique')
+    op.create_unique_constraint('uq_image_tag', 'image_tags', ['image_id', 'tag_id'])
+    op.create_index('ix_image_tags_tag_id_confidence_image_id', 'image_tags', ['tag_id', 'confidence', 'image_id'], unique=False)
+    op.create_foreign_key('image_tags_tag_id_fkey', 'image_tags', 'tags', ['tag_id'], ['id'])
+    op.drop_column('image_tags', 'tag_name')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('image_tags', sa.Column('tag_name', sa.VARCHAR(length=255), autoincrement=False, nullable=True))
+    op.execute(
+        """
+        UPDATE image_tags
+        SET tag_name = tags.name
+        FROM tags
+        WHERE tags.id = image_tags.tag_id
+        """
+    )
+    op.alter_column('image_tags', 'tag_name', nullable=False)
+
+    op.drop_constraint('image_tags_tag_id_fkey', 'image_tags', type_='foreignkey')
+    op.drop_index('ix_image_tags_tag_id_confidence_image_id', table_name='image_tags')
+    op.drop_constraint('uq_image_tag', 'image_tags', type_='unique')
+    op.create_unique_constraint(op.f('uq_image_tag'), 'image_tags', ['image_id', 'tag_name'])
+    op.create_index(op.f('ix_image_tags_tag_name_confidence_image_id'), 'image_tags', ['tag_name', 'confidence', 'image_id'], unique=False)
+    op.drop_column('image_tags', 'tag_id')
+    op.drop_table('tags')
@@ -1,10 +1,14 @@
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
+    LargeBinary,
+    SmallInteger,
     String,
     Float,
     DateTime,
     ForeignKey,
+    Index,
     Text,
     Boolean,
     UniqueConstraint,
@@ -24,11 +28,20 @@ class Image(Base):
     file_size = Column(Integer, nullable=False)
     mime_type = Column(String(100), nullable=False)
     image_hash = Column(String(64), unique=True, nullable=False, index=True)
+    perceptual_hash = Column(BigInteger, nullable=True)
     upload_date = Column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
     processed_date = Column(DateTime(timezone=True), nullable=True)
 
+    __table_args__ = (
+        # upload_date follows insertion order, so a BRIN index stays tiny
+        # and still narrows date range scans to the right block ranges.
+        Index(
+            "ix_images_upload_date_brin", "upload_date", postgresql_using="brin"
+        ),
+    )
+
     tags = relationship(
         "ImageTag",
         back_populates="image",
@@ -40,22 +53,46 @@ class Image(Base):
         return f"<Image {self.filename} ({self.image_hash})>"
 
 
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(255), nullable=False)
+    language = Column(String(10), nullable=False, default="en")
+
+    __table_args__ = (
+        UniqueConstraint("name", "language", name="uq_tag_name_language"),
+    )
+
+    def __repr__(self):
+        return f"<Tag {self.name} ({self.language})>"
+
+
 class ImageTag(Base):
     __tablename__ = "image_tags"
 
     id = Column(Integer, primary_key=True, index=True)
-    image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
-    tag_name = Column(String(255), nullable=False)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False, index=True)
+    tag_id = Column(Integer, ForeignKey("tags.id"), nullable=False)
     confidence = Column(Float, nullable=False)
     language = Column(String(10), default="en")
     is_primary = Column(Boolean, default=False)
 
-    __table_args__ = (UniqueConstraint("image_id", "tag_name", name="uq_image_tag"),)
+    __table_args__ = (
+        UniqueConstraint("image_id", "tag_id", name="uq_image_tag"),
+        Index(
+            "ix_image_tags_tag_id_confidence_image_id",
+            "tag_id",
+            "confidence",
+            "image_id",
+        ),
+    )
 
     image = relationship("Image", back_populates="tags")
+    tag = relationship("Tag", lazy="joined")
 
     def __repr__(self):
-        return f"<Tag {self.tag_name} ({self.confidence}%)>"
+        return f"<ImageTag {self.tag_id} ({self.confidence}%)>"
 
 
 class SampleImage(Base):
@@ -71,3 +108,114 @@ class SampleImage(Base):
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
     is_active = Column(Boolean, default=True)
+
+
+class TaggingResult(Base):
+    __tablename__ = "tagging_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_hash = Column(String(64), nullable=False)
+    language = Column(String(10), nullable=False, default="en")
+    tags_json = Column(Text, nullable=False)
+    created_date = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+    __table_args__ = (
+        UniqueConstraint("image_hash", "language", name="uq_tagging_result"),
+    )
+
+
+class TagStat(Base):
+    __tablename__ = "tag_stats"
+
+    tag_name = Column(String(255), primary_key=True)
+    occurrence_count = Column(Integer, nullable=False, default=0)
+    image_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+
+class TagConfidenceBucket(Base):
+    __tablename__ = "tag_confidence_buckets"
+
+    tag_name = Column(String(255), primary_key=True)
+    # floor(confidence) clamped to [-1, 100]
+    bucket = Column(SmallInteger, primary_key=True)
+    occurrence_count = Column(Integer, nullable=False, default=0)
+    confidence_sum = Column(Float, nullable=False, default=0.0)
+
+
+class TagCooccurrence(Base):
+    __tablename__ = "tag_cooccurrence"
+
+    # Each pair is stored once, with tag_a < tag_b in code point order.
+    tag_a = Column(String(255), primary_key=True)
+    tag_b = Column(String(255), primary_key=True, index=True)
+    image_count = Column(Integer, nullable=False, default=0)
+
+
+class UploadHourStat(Base):
+    __tablename__ = "upload_hour_stats"
+
+    # Start of the UTC hour
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    image_count = Column(Integer, nullable=False, default=0)
+
+
+class TagHourStat(Base):
+    __tablename__ = "tag_hour_stats"
+
+    tag_name = Column(String(255), primary_key=True)
+    hour = Column(DateTime(timezone=True), primary_key=True)
+    occurrence_count = Column(Integer, nullable=False, default=0)
+
+
+class GlobalStat(Base):
+    __tablename__ = "global_stats"
+
+    id = Column(Integer, primary_key=True)
+    total_images = Column(Integer, nullable=False, default=0)
+    total_tags = Column(Integer, nullable=False, default=0)
+    min_confidence = Column(Float, nullable=True)
+
+
+class TaggingJob(Base):
+    __tablename__ = "tagging_jobs"
+
+    id = Column(Integer, primary_key=True)
+    # queued -> running -> done | failed; dead once retries are exhausted
+    status = Column(String(20), nullable=False, default="queued")
+    filename = Column(String(255), nullable=False)
+    content_type = Column(String(100), nullable=False)
+    file_size = Column(Integer, nullable=False)
+    image_hash = Column(String(64), nullable=False, index=True)
+    perceptual_hash = Column(BigInteger, nullable=True)
+    # File under JOB_PAYLOAD_DIR holding the image; removed once the job is
+    # done or failed for good.
+    image_path = Column(String(255), nullable=True)
+    # Only set on jobs queued before payloads moved to disk.
+    image_data = Column(LargeBinary, nullable=True)
+    confidence_threshold = Column(Float, nullable=False)
+    language = Column(String(10), nullable=False, default="en")
+    attempts = Column(Integer, nullable=False, default=0)
+    # Next time a worker may claim the job: the retry time while queued,
+    # the end of the visibility timeout while running.
+    available_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+    )
+    last_error = Column(Text, nullable=True)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=True)
+    result_json = Column(Text, nullable=True)
+    created_date = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    finished_date = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_tagging_jobs_status_available_at", "status", "available_at"),
+    )
+
+    def __repr__(self):
+        return f"<TaggingJob {self.id} ({self.status})>"
@@ -0,0 +1,192 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import async_session_maker
+from app.id_cursor import IdCursor
+from app.models import Image
+
+
+logger = logging.getLogger(__name__)
+
+# Roughly log2(n) bits per chunk keeps buckets near one hash each at a few
+# million images, which is where multi-index hashing beats a linear scan.
+CHUNK_WIDTHS = (22, 21, 21)
+CHUNK_SHIFTS = (0, 22, 43)
+# Approximate cost of one probe (two binary searches) in linear-scan elements.
+PROBE_COST = 256
+
+
+def to_unsigned(perceptual_hash: int) -> int:
+    return perceptual_hash & 0xFFFFFFFFFFFFFFFF
+
+
+def to_signed(perceptual_hash: int) -> int:
+    # Postgres has no unsigned 64-bit type, so hashes are stored as BIGINT.
+    if perceptual_hash >= 1 << 63:
+        return perceptual_hash - (1 << 64)
+    return perceptual_hash
+
+
+@lru_cache(maxsize=None)
+def _flip_masks(width: int, radius: int) -> np.ndarray:
+    masks = [0]
+    for distance in range(1, radius + 1):
+        for bits in itertools.combinations(range(width), distance):
+            masks.append(sum(1 << bit for bit in bits))
+    return np.array(masks, dtype=np.uint32)
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit perceptual hashes.
+
+    Each hash is split into three chunks. Two hashes within distance r must
+    agree to within r // 3 bits on at least one chunk, so a lookup only
+    probes the few sorted chunk values around the query instead of scanning
+    every hash. New hashes go to a small unsorted buffer that is merged into
+    the sorted arrays once it grows past ``merge_threshold``.
+    """
+
+    def __init__(self, merge_threshold: int = 10000):
+        self.merge_threshold = merge_threshold
+        self.ids = np.empty(0, dtype=np.int64)
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.chunk_values = [np.empty(0, dtype=np.uint32) for _ in CHUNK_WIDTHS]
+        self.chunk_order = [np.empty(0, dtype=np.int64) for _ in CHUNK_WIDTHS]
+        self.pending_ids = []
+        self.pending_hashes = []
+
+    def __len__(self) -> int:
+        return len(self.ids) + len(self.pending_ids)
+
+    def add(self, image_id: int, perceptual_hash: int) -> None:
+        self.pending_ids.append(image_id)
+        self.pending_hashes.append(to_unsigned(perceptual_hash))
+        if len(self.pending_ids) >= self.merge_threshold:
+            self.merge()
+
+    def add_many(self, ids, hashes) -> None:
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.hashes = np.concatenate(
+            [self.hashes, np.asarray(hashes, dtype=np.int64).view(np.uint64)]
+        )
+        self._rebuild()
+
+    def merge(self) -> None:
+        if not self.pending_ids:
+            return
+
+        pending_ids, pending_hashes = self.pending_ids, self.pending_hashes
+        self.pending_ids = []
+        self.pending_hashes = []
+        self.add_many(
+            pending_ids, [to_signed(pending_hash) for pending_hash in pending_hashes]
+        )
+
+    def _rebuild(self) -> None:
+        for chunk, (width, shift) in enumerate(zip(CHUNK_WIDTHS, CHUNK_SHIFTS)):
+            values = (self.hashes >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+            values = values.astype(np.uint32)
+            order = np.argsort(values, kind="stable")
+            self.chunk_values[chunk] = values[order]
+            self.chunk_order[chunk] = order
+
+    def search(
+        self, perceptual_hash: int, max_distance: int
+    ) -> List[Tuple[int, int]]:
+        query = to_unsigned(perceptual_hash)
+        radius = max_distance // len(CHUNK_WIDTHS)
+        probe_count = sum(len(_flip_masks(width, radius)) for width in CHUNK_WIDTHS)
+
+        if probe_count * PROBE_COST > len(self.hashes):
+            # Wide radii probe so many chunk values that one vectorized pass
+            # over every hash is cheaper than the binary searches.
+            positions = slice(None)
+        else:
+            candidates = []
+            for chunk, (width, shift) in enumerate(zip(CHUNK_WIDTHS, CHUNK_SHIFTS)):
+                values = self.chunk_values[chunk]
+                chunk_value = (query >> shift) & ((1 << width) - 1)
+                probes = np.uint32(chunk_value) ^ _flip_masks(width, radius)
+                starts = np.searchsorted(values, probes, side="left")
+                ends = np.searchsorted(values, probes, side="right")
+                hits = starts < ends
+                starts, lengths = starts[hits], (ends - starts)[hits]
+                offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                candidates.append(
+                    self.chunk_order[chunk][offsets + np.arange(lengths.sum())]
+                )
+            positions = np.unique(np.concatenate(candidates))
+
+        distances = np.bitwise_count(self.hashes[positions] ^ np.uint64(query))
+        within = distances <= max_distance
+        matches = dict(
+            zip(self.ids[positions][within].tolist(), distances[within].tolist())
+        )
+
+        for image_id, pending_hash in zip(self.pending_ids, self.pending_hashes):
+            distance = (pending_hash ^ query).bit_count()
+            if distance <= max_distance:
+                matches[image_id] = distance
+
+        return sorted(matches.items(), key=lambda match: (match[1], match[0]))
+
+
+class PerceptualHashIndex:
+    def __init__(self):
+        self.index = HammingIndex()
+        self.cursor = IdCursor(settings.INDEX_REFRESH_ID_LOOKBACK)
+        self.last_refresh = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self) -> int:
+        ids = []
+        hashes = []
+        async with self._lock, async_session_maker() as session:
+            result = await session.stream(
+                select(Image.id, Image.perceptual_hash)
+                .where(self.cursor.condition(Image.id))
+                .order_by(Image.id)
+                .execution_options(yield_per=10000)
+            )
+            async for image_id, perceptual_hash in result:
+                if self.cursor.advance(image_id) and perceptual_hash is not None:
+                    ids.append(image_id)
+                    hashes.append(perceptual_hash)
+            self.cursor.prune()
+
+            if len(ids) >= self.index.merge_threshold:
+                self.index.add_many(ids, hashes)
+            else:
+                for image_id, perceptual_hash in zip(ids, hashes):
+                    self.index.add(image_id, perceptual_hash)
+
+        self.last_refresh = time.monotonic()
+        return len(ids)
+
+    async def load(self) -> None:
+        count = await self.refresh()
+        logger.info(f"Loaded {count} perceptual hashes into the similarity index")
+
+    async def search(
+        self, perceptual_hash: int, max_distance: int
+    ) -> List[Tuple[int, int]]:
+        refresh_age = time.monotonic() - self.last_refresh
+        if refresh_age > settings.PHASH_INDEX_REFRESH_INTERVAL:
+            await self.refresh()
+        return self.index.search(perceptual_hash, max_distance)
+
+    def add(self, image_id: int, perceptual_hash: Optional[int]) -> None:
+        if self.cursor.added(image_id) and perceptual_hash is not None:
+            self.index.add(image_id, perceptual_hash)
+
+
+phash_index = PerceptualHashIndex()
@@ -0,0 +1,232 @@
+"""Opt-in request profiling and slow-request capture.
+
+A request is profiled with cProfile when it carries ``X-Admin-Token`` equal
+to ``PROFILING_ADMIN_TOKEN``, or when it is picked at ``PROFILING_SAMPLE_RATE``.
+cProfile sees the whole event loop, so a profile also contains whatever
+other requests ran meanwhile; only one request per worker is profiled at a
+time. Every request records its SQL statements, so one slower than
+``PROFILING_SLOW_REQUEST_THRESHOLD`` is kept with its SQL even unprofiled.
+
+Captures go to ``PROFILING_DIR``, keeping the newest ``PROFILING_MAX_CAPTURES``.
+"""
+
+import asyncio
+import cProfile
+import glob
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import time
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+from sqlalchemy import event
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+MAX_STATEMENTS = 1000
+MAX_STATEMENT_LENGTH = 2000
+PROFILE_LINES = 60
+
+_statements: ContextVar[Optional[list]] = ContextVar("statements", default=None)
+_profiler_busy = False
+
+
+def capture_sql(sync_engine) -> None:
+    """Record statements and their timings for the request being served."""
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        context._profiling_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        statements = _statements.get()
+        started = getattr(context, "_profiling_started", None)
+        if statements is None or started is None:
+            return
+        if len(statements) < MAX_STATEMENTS:
+            statements.append(
+                (statement[:MAX_STATEMENT_LENGTH], time.perf_counter() - started)
+            )
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    if not settings.PROFILING_ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(
+        token.encode(), settings.PROFILING_ADMIN_TOKEN.encode()
+    )
+
+
+def _capture_path(capture_id: str, extension: str) -> str:
+    return os.path.join(settings.PROFILING_DIR, f"{capture_id}.{extension}")
+
+
+def _save_capture(capture: dict, profiler: Optional[cProfile.Profile]) -> None:
+    os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+    if profiler is not None:
+        stream = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stream)
+        stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+        capture["profile"] = stream.getvalue()
+        profiler.dump_stats(_capture_path(capture["id"], "prof"))
+
+    path = _capture_path(capture["id"], "json")
+    with open(f"{path}.tmp", "w") as capture_file:
+        json.dump(capture, capture_file)
+    os.replace(f"{path}.tmp", path)
+
+    # Capture ids start with a timestamp, so name order is age order.
+    captures = sorted(glob.glob(_capture_path("*", "json")))
+    for old in captures[: max(len(captures) - settings.PROFILING_MAX_CAPTURES, 0)]:
+        base = os.path.splitext(old)[0]
+        for extension in ("json", "prof"):
+            try:
+                os.remove(f"{base}.{extension}")
+            except FileNotFoundError:
+                pass
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    def _trigger(self, scope) -> Optional[str]:
+        headers = dict(scope["headers"])
+        token = headers.get(ADMIN_TOKEN_HEADER.lower().encode())
+        if token is not None and is_admin_token(token.decode("latin-1")):
+            return "header"
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            return "sample"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/admin/"):
+            await self.app(scope, receive, send)
+            return
+
+        global _profiler_busy
+        profiler = None
+        trigger = self._trigger(scope)
+        if trigger is not None and not _profiler_busy:
+            _profiler_busy = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        statements: List[tuple] = []
+        token = _statements.set(statements)
+        started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            _statements.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                _profiler_busy = False
+
+            threshold = settings.PROFILING_SLOW_REQUEST_THRESHOLD
+            if trigger is None and threshold > 0 and duration >= threshold:
+                trigger = "slow"
+            if trigger is not None:
+                capture = {
+                    "id": f"{time.time_ns()}-{os.getpid()}",
+                    "trigger": trigger,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "query_string": scope["query_string"].decode("latin-1"),
+                    "route": getattr(scope.get("route"), "path", None),
+                    "status": status,
+                    "started_at": started_at.isoformat(),
+                    "duration_ms": round(duration * 1000, 2),
+                    "sql_count": len(statements),
+                    "sql_ms": round(sum(d for _, d in statements) * 1000, 2),
+                    "sql": [
+                        {"statement": statement, "duration_ms": round(d * 1000, 3)}
+                        for statement, d in statements
+                    ],
+                    "profile": None,
+                }
+                try:
+                    await asyncio.to_thread(_save_capture, capture, profiler)
+                except OSError as e:
+                    logger.error(f"Could not save request profile: {str(e)}")
+
+
+def _load_capture(capture_id: str) -> dict:
+    try:
+        with open(_capture_path(os.path.basename(capture_id), "json")) as capture:
+            return json.load(capture)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+
+def _list_captures(limit: int) -> List[dict]:
+    captures = []
+    for path in sorted(glob.glob(_capture_path("*", "json")), reverse=True)[:limit]:
+        try:
+            with open(path) as capture_file:
+                capture = json.load(capture_file)
+        except FileNotFoundError:
+            continue
+        capture.pop("sql")
+        capture["profiled"] = capture.pop("profile") is not None
+        captures.append(capture)
+    return captures
+
+
+async def require_admin(
+    x_admin_token: Optional[str] = Header(None, alias=ADMIN_TOKEN_HEADER),
+):
+    if not settings.PROFILING_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(
+    prefix="/admin/profiles",
+    tags=["Администрирование"],
+    dependencies=[Depends(require_admin)],
+)
+
+
+@router.get("/")
+async def get_profiles(limit: int = Query(50, ge=1, le=1000)):
+    return {"profiles": await asyncio.to_thread(_list_captures, limit)}
+
+
+@router.get("/{capture_id}")
+async def get_profile(capture_id: str):
+    return await asyncio.to_thread(_load_capture, capture_id)
+
+
+@router.get("/{capture_id}/pstats")
+async def download_profile(capture_id: str):
+    """Raw cProfile output, for snakeviz or ``python -m pstats``."""
+    path = _capture_path(os.path.basename(capture_id), "prof")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=f"{capture_id}.prof")
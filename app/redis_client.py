@@ -1,25 +1,227 @@
-import redis
+import asyncio
 import json
+import logging
+import secrets
+import time
+
+from typing import Optional
+
+import redis.asyncio as redis
+
 from app.config import settings
+from app.metrics import record_cache_lookups
 
 
+logger = logging.getLogger(__name__)
+
 config = {
     "host": settings.REDIS_HOST,
     "port": settings.REDIS_PORT,
     "decode_responses": True,
+    "max_connections": settings.REDIS_MAX_CONNECTIONS,
+    "socket_timeout": settings.REDIS_SOCKET_TIMEOUT,
+    "socket_connect_timeout": settings.REDIS_SOCKET_TIMEOUT,
 }
 
 if settings.REDIS_PASSWORD:
     config["password"] = settings.REDIS_PASSWORD
 
 
-redis_client = redis.Redis(**config)
+redis_client = None
+_unavailable_until = 0.0
+
+REDIS_ERRORS = (redis.RedisError, OSError, asyncio.TimeoutError)
+
+
+async def init_redis(client=None):
+    global redis_client
+    redis_client = client or redis.Redis(
+        connection_pool=redis.ConnectionPool(**config)
+    )
+
+
+async def close_redis():
+    global redis_client
+    if redis_client is not None:
+        await redis_client.aclose()
+        redis_client = None
+
+
+def _is_available() -> bool:
+    return redis_client is not None and time.monotonic() >= _unavailable_until
+
 
+def _mark_unavailable(e: Exception) -> None:
+    global _unavailable_until
+    _unavailable_until = time.monotonic() + settings.REDIS_RETRY_AFTER
+    logger.warning(f"Redis unavailable, serving without cache: {str(e)}")
 
-def get_cached_data(key):
-    data = redis_client.get(key)
+
+async def get_cached_data(key, cache: Optional[str] = None):
+    """Cached value for ``key``; lookups are counted under ``cache`` when given."""
+    data = None
+    if _is_available():
+        try:
+            data = await redis_client.get(key)
+        except REDIS_ERRORS as e:
+            _mark_unavailable(e)
+
+    if cache is not None:
+        record_cache_lookups(cache, hits=int(bool(data)), misses=int(not data))
     return json.loads(data) if data else None
 
 
-def set_cached_data(key, data, expire=3600):
-    redis_client.setex(key, expire, json.dumps(data))
+async def set_cached_data(key, data, expire=3600):
+    if not _is_available():
+        return
+
+    try:
+        await redis_client.setex(key, expire, json.dumps(data))
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+
+
+async def get_many_cached(keys, cache: Optional[str] = None) -> dict:
+    keys = list(keys)
+    values = []
+    if keys and _is_available():
+        try:
+            values = await redis_client.mget(keys)
+        except REDIS_ERRORS as e:
+            _mark_unavailable(e)
+
+    found = {key: json.loads(value) for key, value in zip(keys, values) if value}
+    if cache is not None:
+        record_cache_lookups(cache, hits=len(found), misses=len(keys) - len(found))
+    return found
+
+
+async def set_many_cached(mapping: dict, expire=3600):
+    if not mapping or not _is_available():
+        return
+
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for key, data in mapping.items():
+                pipe.setex(key, expire, json.dumps(data))
+            await pipe.execute()
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+
+
+# A counter alone restarts from 0 once Redis loses it (flush, eviction, a
+# restart without persistence) and hands out old values again. Each
+# incarnation of the hash gets a random epoch, created on first use; the
+# generation is "<epoch>.<count>". ARGV[2] == "1" bumps the count.
+GENERATION_SCRIPT = """
+redis.call('HSETNX', KEYS[1], 'epoch', ARGV[1])
+if ARGV[2] == '1' then
+    redis.call('HINCRBY', KEYS[1], 'count', 1)
+end
+local state = redis.call('HMGET', KEYS[1], 'epoch', 'count')
+return state[1] .. '.' .. (state[2] or '0')
+"""
+
+
+async def _generation(key, bump: bool) -> Optional[str]:
+    if not _is_available():
+        return None
+
+    try:
+        script = redis_client.register_script(GENERATION_SCRIPT)
+        return await script(keys=[key], args=[secrets.token_hex(4), int(bump)])
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+        return None
+
+
+async def get_generation(key) -> Optional[str]:
+    """Changes on every bump and never repeats; None without Redis."""
+    return await _generation(key, bump=False)
+
+
+async def bump_generation(key) -> Optional[str]:
+    return await _generation(key, bump=True)
+
+
+async def acquire_lock(key, expire: float) -> Optional[str]:
+    """A token to release the lock with, or None if someone else holds it."""
+    token = secrets.token_hex(8)
+    # Without Redis there's nobody to coordinate with, so let the caller go.
+    if not _is_available():
+        return token
+
+    try:
+        locked = await redis_client.set(key, token, nx=True, px=int(expire * 1000))
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+        return token
+
+    return token if locked else None
+
+
+# Deletes the lock only while it still holds the caller's token: once it
+# expires another worker may own it, and a plain DEL would release theirs.
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+async def release_lock(key, token: str):
+    if not _is_available():
+        return
+
+    try:
+        script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+        await script(keys=[key], args=[token])
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+
+
+# Token bucket refilled at ARGV[1] tokens/s up to ARGV[2]. A caller may
+# reserve a token up to ARGV[3] seconds ahead, which lets the bucket go
+# negative; it gets back how long to wait before using it.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local max_wait = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens < 1 then
+    wait = (1 - tokens) / rate
+end
+if wait <= max_wait then
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - 1), 'updated', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst / rate + max_wait) * 1000) + 1000)
+end
+return tostring(wait)
+"""
+
+
+async def reserve_token(
+    key, rate: float, burst: float, max_wait: float
+) -> Optional[float]:
+    """Seconds to wait for a token from a bucket shared by every worker.
+
+    Nothing is reserved when the wait would exceed ``max_wait``. None means
+    Redis is unavailable and the caller has to limit on its own.
+    """
+    if not _is_available():
+        return None
+
+    try:
+        script = redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+        wait = await script(keys=[key], args=[rate, burst, max_wait])
+    except REDIS_ERRORS as e:
+        _mark_unavailable(e)
+        return None
+
+    return float(wait)
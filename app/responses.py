@@ -0,0 +1,35 @@
+"""orjson-backed JSON responses.
+
+``FastJSONResponse`` is the app's default response class, but FastAPI still
+runs a returned dict through ``jsonable_encoder`` before rendering it. Hot
+routes return a ``FastJSONResponse`` themselves to skip that pass; orjson
+handles the datetimes and numpy values they contain on its own.
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(
+        content,
+        default=_default,
+        option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+    )
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
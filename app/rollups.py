@@ -0,0 +1,710 @@
+"""Incrementally maintained analytics rollups.
+
+``tag_stats`` holds per-tag counters, ``tag_confidence_buckets`` the same
+counters split by whole-point confidence, ``tag_cooccurrence`` the number
+of images each pair of tags shares, ``upload_hour_stats`` and
+``tag_hour_stats`` uploads per UTC hour and ``global_stats`` a single row
+of table-wide counters. All are updated in the same transaction as the
+image/tag rows they summarize. Run ``python -m app.rollups rebuild`` to
+recompute them from scratch or ``python -m app.rollups check`` to compare
+them with the base tables.
+"""
+
+import argparse
+import asyncio
+import itertools
+import logging
+import math
+import time
+
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import SmallInteger, delete, distinct, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.cooccurrence import compute_cooccurrence
+from app.database import async_session_maker
+from app.models import (
+    GlobalStat,
+    Image,
+    ImageTag,
+    Tag,
+    TagConfidenceBucket,
+    TagCooccurrence,
+    TagHourStat,
+    TagStat,
+    UploadHourStat,
+)
+
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_STATS_ID = 1
+BUCKET_MIN = -1
+BUCKET_MAX = 100
+
+# The order apply_tag_stats writes the rollup tables in.
+ROLLUP_WRITE_ORDER = (
+    TagStat,
+    TagConfidenceBucket,
+    TagCooccurrence,
+    TagHourStat,
+    UploadHourStat,
+    GlobalStat,
+)
+
+# (tag_name, occurrence_count, avg_confidence, image_count)
+TopTag = Tuple[str, int, float, int]
+
+
+def confidence_bucket(confidence: float) -> int:
+    return min(max(math.floor(confidence), BUCKET_MIN), BUCKET_MAX)
+
+
+def _bucket_expression():
+    return func.least(
+        func.greatest(func.floor(ImageTag.confidence), BUCKET_MIN), BUCKET_MAX
+    ).cast(SmallInteger)
+
+
+async def _add_counts(
+    session: AsyncSession, model, keys: List[str], rows: List[dict]
+) -> None:
+    """Upsert ``rows``, adding their non-key columns onto existing counters.
+
+    Callers pass rows sorted by key so concurrent writers lock them in the
+    same order and can't deadlock.
+    """
+    stmt = insert(model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={
+            column: getattr(model, column) + stmt.excluded[column]
+            for column in rows[0]
+            if column not in keys
+        },
+    )
+    await session.execute(stmt, rows)
+
+
+def upload_hour(upload_date: datetime) -> datetime:
+    return upload_date.astimezone(timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+
+
+async def apply_tag_stats(
+    session: AsyncSession,
+    tag_rows: List[dict],
+    upload_dates: Dict[int, Optional[datetime]],
+    new_images: bool = False,
+    sign: int = 1,
+) -> None:
+    """Add (sign=1) or remove (sign=-1) tag rows from the rollups.
+
+    ``tag_rows`` are the image_tags rows being inserted or deleted, as dicts
+    with ``image_id``, ``tag_name`` and ``confidence``. ``upload_dates``
+    maps every image involved to its upload_date; with ``new_images`` those
+    images are counted as new uploads too.
+    """
+    per_tag = {}
+    per_bucket = {}
+    per_image = {}
+    per_hour = Counter()
+    for row in tag_rows:
+        stats = per_tag.setdefault(row["tag_name"], [0, set(), 0.0])
+        stats[0] += 1
+        stats[1].add(row["image_id"])
+        stats[2] += row["confidence"]
+
+        bucket = (row["tag_name"], confidence_bucket(row["confidence"]))
+        stats = per_bucket.setdefault(bucket, [0, 0.0])
+        stats[0] += 1
+        stats[1] += row["confidence"]
+
+        per_image.setdefault(row["image_id"], []).append(row["tag_name"])
+
+        upload_date = upload_dates.get(row["image_id"])
+        if upload_date is not None:
+            per_hour[row["tag_name"], upload_hour(upload_date)] += 1
+
+    per_pair = Counter()
+    for tag_names in per_image.values():
+        per_pair.update(itertools.combinations(sorted(tag_names), 2))
+
+    if per_tag:
+        await _add_counts(
+            session,
+            TagStat,
+            ["tag_name"],
+            [
+                {
+                    "tag_name": tag_name,
+                    "occurrence_count": sign * occurrences,
+                    "image_count": sign * len(image_ids),
+                    "confidence_sum": sign * confidence_sum,
+                }
+                for tag_name, (occurrences, image_ids, confidence_sum) in sorted(
+                    per_tag.items()
+                )
+            ],
+        )
+        await _add_counts(
+            session,
+            TagConfidenceBucket,
+            ["tag_name", "bucket"],
+            [
+                {
+                    "tag_name": tag_name,
+                    "bucket": bucket,
+                    "occurrence_count": sign * occurrences,
+                    "confidence_sum": sign * confidence_sum,
+                }
+                for (tag_name, bucket), (occurrences, confidence_sum) in sorted(
+                    per_bucket.items()
+                )
+            ],
+        )
+
+    if per_pair:
+        await _add_counts(
+            session,
+            TagCooccurrence,
+            ["tag_a", "tag_b"],
+            [
+                {"tag_a": tag_a, "tag_b": tag_b, "image_count": sign * image_count}
+                for (tag_a, tag_b), image_count in sorted(per_pair.items())
+            ],
+        )
+
+    if per_hour:
+        await _add_counts(
+            session,
+            TagHourStat,
+            ["tag_name", "hour"],
+            [
+                {"tag_name": tag_name, "hour": hour, "occurrence_count": sign * count}
+                for (tag_name, hour), count in sorted(per_hour.items())
+            ],
+        )
+
+    image_delta = 0
+    if new_images:
+        image_delta = sign * len(upload_dates)
+        image_hours = Counter(
+            upload_hour(upload_date)
+            for upload_date in upload_dates.values()
+            if upload_date is not None
+        )
+        if image_hours:
+            await _add_counts(
+                session,
+                UploadHourStat,
+                ["hour"],
+                [
+                    {"hour": hour, "image_count": sign * count}
+                    for hour, count in sorted(image_hours.items())
+                ],
+            )
+
+    if sign < 0 and per_tag:
+        await session.execute(
+            delete(TagStat).where(
+                TagStat.tag_name.in_(per_tag), TagStat.occurrence_count <= 0
+            )
+        )
+        await session.execute(
+            delete(TagConfidenceBucket).where(
+                TagConfidenceBucket.tag_name.in_(per_tag),
+                TagConfidenceBucket.occurrence_count <= 0,
+            )
+        )
+        await session.execute(
+            delete(TagCooccurrence).where(
+                TagCooccurrence.tag_a.in_(per_tag), TagCooccurrence.image_count <= 0
+            )
+        )
+        await session.execute(
+            delete(TagHourStat).where(
+                TagHourStat.tag_name.in_(per_tag), TagHourStat.occurrence_count <= 0
+            )
+        )
+
+    if not per_tag and not image_delta:
+        return
+
+    min_confidence = None
+    if sign > 0 and tag_rows:
+        min_confidence = min(row["confidence"] for row in tag_rows)
+
+    stmt = insert(GlobalStat).values(
+        id=GLOBAL_STATS_ID,
+        total_images=image_delta,
+        total_tags=sign * len(tag_rows),
+        min_confidence=min_confidence,
+    )
+    await session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[GlobalStat.id],
+            set_={
+                "total_images": GlobalStat.total_images + stmt.excluded.total_images,
+                "total_tags": GlobalStat.total_tags + stmt.excluded.total_tags,
+                # Only ever lowered: a conservative bound is enough to know
+                # whether a confidence filter could exclude any stored tag.
+                "min_confidence": func.least(
+                    GlobalStat.min_confidence, stmt.excluded.min_confidence
+                ),
+            },
+        )
+    )
+
+
+async def get_global_stats(session: AsyncSession) -> GlobalStat:
+    result = await session.execute(
+        select(GlobalStat).where(GlobalStat.id == GLOBAL_STATS_ID)
+    )
+    return result.scalar_one_or_none() or GlobalStat(
+        id=GLOBAL_STATS_ID, total_images=0, total_tags=0, min_confidence=None
+    )
+
+
+async def top_tags_sql(
+    session: AsyncSession, min_confidence: float, limit: int
+) -> List[TopTag]:
+    # Aggregate on the integer tag_id first; only the per-tag totals are
+    # joined to names (and merged across languages).
+    per_tag = (
+        select(
+            ImageTag.tag_id,
+            func.count(ImageTag.id).label("occurrences"),
+            func.sum(ImageTag.confidence).label("confidence_sum"),
+        )
+        .where(ImageTag.confidence >= min_confidence)
+        .group_by(ImageTag.tag_id)
+        .subquery()
+    )
+    occurrences = func.sum(per_tag.c.occurrences)
+    result = await session.execute(
+        select(
+            Tag.name,
+            occurrences,
+            func.sum(per_tag.c.confidence_sum) / occurrences,
+            occurrences,
+        )
+        .join(per_tag, per_tag.c.tag_id == Tag.id)
+        .group_by(Tag.name)
+        .order_by(occurrences.desc(), Tag.name.collate("C"))
+        .limit(limit)
+    )
+    return [
+        (tag_name, int(count), avg_confidence, int(image_count))
+        for tag_name, count, avg_confidence, image_count in result
+    ]
+
+
+class TagHistogram:
+    """In-process copy of ``tag_confidence_buckets`` as per-tag suffix sums.
+
+    Column ``j`` of ``counts``/``sums`` totals every bucket at or above
+    ``BUCKET_MIN + j``, so top tags for an integer threshold is one column
+    read plus a sort over the tags, however many image_tags rows there are.
+    Thresholds that fall inside a bucket are left to SQL. The copy is
+    reloaded when asked for a newer data generation than it was loaded at,
+    and otherwise once it is older than TAG_HISTOGRAM_REFRESH_INTERVAL.
+    """
+
+    def __init__(self):
+        self.tag_names = np.empty(0, dtype=object)
+        self.counts = np.zeros((0, BUCKET_MAX - BUCKET_MIN + 1), dtype=np.int64)
+        self.sums = np.zeros((0, BUCKET_MAX - BUCKET_MIN + 1))
+        self.last_refresh = 0.0
+        self.generation: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, generation: Optional[str] = None) -> None:
+        """Reload; ``generation`` must have been read before calling."""
+        async with self._lock:
+            await self._reload(generation)
+
+    async def _reload(self, generation: Optional[str]) -> None:
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(
+                    TagConfidenceBucket.tag_name,
+                    TagConfidenceBucket.bucket,
+                    TagConfidenceBucket.occurrence_count,
+                    TagConfidenceBucket.confidence_sum,
+                )
+            )
+            rows = result.all()
+        self.load(rows)
+        self.generation = generation
+
+    def _stale(self, generation: Optional[str]) -> bool:
+        if generation is not None and generation != self.generation:
+            return True
+        refresh_age = time.monotonic() - self.last_refresh
+        return refresh_age > settings.TAG_HISTOGRAM_REFRESH_INTERVAL
+
+    async def _refresh_if_stale(self, generation: Optional[str]) -> None:
+        if not self._stale(generation):
+            return
+        async with self._lock:
+            # Another request may have reloaded it while this one waited.
+            if self._stale(generation):
+                await self._reload(generation)
+
+    def load(self, rows) -> None:
+        """Rebuild from ``(tag_name, bucket, occurrences, confidence_sum)`` rows."""
+        # Sorted names make a stable sort on count break ties by name, the
+        # same order as the SQL fallback's C-collation ORDER BY.
+        tag_names, tag_index = np.unique(
+            np.array([row[0] for row in rows], dtype=object), return_inverse=True
+        )
+        columns = np.array([row[1] for row in rows], dtype=np.int64) - BUCKET_MIN
+        counts = np.zeros((len(tag_names), self.counts.shape[1]), dtype=np.int64)
+        sums = np.zeros((len(tag_names), self.sums.shape[1]))
+        counts[tag_index, columns] = [row[2] for row in rows]
+        sums[tag_index, columns] = [row[3] for row in rows]
+
+        self.tag_names = tag_names
+        self.counts = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+        self.sums = np.cumsum(sums[:, ::-1], axis=1)[:, ::-1]
+        self.last_refresh = time.monotonic()
+
+    @staticmethod
+    def column(
+        min_confidence: float, lowest_confidence: Optional[float]
+    ) -> Optional[int]:
+        if lowest_confidence is None or min_confidence <= lowest_confidence:
+            return 0
+        if float(min_confidence).is_integer() and 0 <= min_confidence <= BUCKET_MAX:
+            return int(min_confidence) - BUCKET_MIN
+        return None
+
+    def rank(self, column: int, limit: int) -> List[TopTag]:
+        counts = self.counts[:, column]
+        present = np.flatnonzero(counts > 0)
+        top = present[np.argsort(-counts[present], kind="stable")][:limit]
+        return [
+            (tag_name, count, confidence_sum / count, count)
+            for tag_name, count, confidence_sum in zip(
+                self.tag_names[top].tolist(),
+                counts[top].tolist(),
+                self.sums[top, column].tolist(),
+            )
+        ]
+
+    async def top_tags(
+        self,
+        min_confidence: float,
+        lowest_confidence: Optional[float],
+        limit: int,
+        generation: Optional[str] = None,
+    ) -> Optional[List[TopTag]]:
+        """Top tags by occurrences at ``confidence >= min_confidence``.
+
+        Returns None when the threshold doesn't fall on a bucket boundary.
+        ``image_count`` equals ``occurrence_count`` since a tag appears at
+        most once per image. Pass the data generation the answer is for.
+        """
+        column = self.column(min_confidence, lowest_confidence)
+        if column is None:
+            return None
+
+        await self._refresh_if_stale(generation)
+        return self.rank(column, limit)
+
+
+tag_histogram = TagHistogram()
+
+
+def _base_tag_stats_query():
+    return (
+        select(
+            Tag.name,
+            func.count(ImageTag.id),
+            func.count(distinct(ImageTag.image_id)),
+            func.sum(ImageTag.confidence),
+        )
+        .join(Tag, Tag.id == ImageTag.tag_id)
+        .group_by(Tag.name)
+    )
+
+
+def _base_buckets_query():
+    bucket = _bucket_expression()
+    return (
+        select(
+            Tag.name,
+            bucket,
+            func.count(ImageTag.id),
+            func.sum(ImageTag.confidence),
+        )
+        .join(Tag, Tag.id == ImageTag.tag_id)
+        .group_by(Tag.name, bucket)
+    )
+
+
+def _hour_expression():
+    return func.date_trunc("hour", Image.upload_date, "UTC")
+
+
+def _base_upload_hours_query():
+    hour = _hour_expression()
+    return (
+        select(hour, func.count(Image.id))
+        .where(Image.upload_date.is_not(None))
+        .group_by(hour)
+    )
+
+
+def _base_tag_hours_query():
+    hour = _hour_expression()
+    return (
+        select(Tag.name, hour, func.count(ImageTag.id))
+        .join(Image, Image.id == ImageTag.image_id)
+        .join(Tag, Tag.id == ImageTag.tag_id)
+        .where(Image.upload_date.is_not(None))
+        .group_by(Tag.name, hour)
+    )
+
+
+def _compare_counts(name: str, expected: dict, actual: dict) -> List[str]:
+    mismatched = sorted(
+        key
+        for key in expected.keys() | actual.keys()
+        if expected.get(key) != actual.get(key)
+    )
+    problems = [
+        f"{name}[{key}]: expected {expected.get(key)}, found {actual.get(key)}"
+        for key in mismatched[:20]
+    ]
+    if len(mismatched) > 20:
+        problems.append(f"... and {len(mismatched) - 20} more {name} rows")
+    return problems
+
+
+def _close(expected: float, actual: float) -> bool:
+    return abs(expected - actual) <= 1e-6 * max(1.0, abs(expected))
+
+
+async def _base_global_stats(session: AsyncSession) -> tuple:
+    total_images = await session.scalar(select(func.count(Image.id)))
+    total_tags = await session.scalar(select(func.count(ImageTag.id)))
+    min_confidence = await session.scalar(select(func.min(ImageTag.confidence)))
+    return total_images or 0, total_tags or 0, min_confidence
+
+
+async def rebuild_rollups() -> None:
+    async with async_session_maker() as session:
+        # Block uploads' rollup writes so the rebuilt counters aren't missing
+        # rows committed while the aggregates were being computed. The
+        # tables are locked in the order apply_tag_stats writes them, so an
+        # upload already holding some of them can finish instead of
+        # deadlocking against the rebuild.
+        tables = ", ".join(model.__tablename__ for model in ROLLUP_WRITE_ORDER)
+        await session.execute(
+            text(f"LOCK TABLE {tables} IN SHARE ROW EXCLUSIVE MODE")
+        )
+        await session.execute(delete(TagStat))
+        await session.execute(
+            insert(TagStat).from_select(
+                ["tag_name", "occurrence_count", "image_count", "confidence_sum"],
+                _base_tag_stats_query(),
+            )
+        )
+        await session.execute(delete(TagConfidenceBucket))
+        await session.execute(
+            insert(TagConfidenceBucket).from_select(
+                ["tag_name", "bucket", "occurrence_count", "confidence_sum"],
+                _base_buckets_query(),
+            )
+        )
+
+        await session.execute(delete(UploadHourStat))
+        await session.execute(
+            insert(UploadHourStat).from_select(
+                ["hour", "image_count"], _base_upload_hours_query()
+            )
+        )
+        await session.execute(delete(TagHourStat))
+        await session.execute(
+            insert(TagHourStat).from_select(
+                ["tag_name", "hour", "occurrence_count"], _base_tag_hours_query()
+            )
+        )
+
+        tag_names, pairs = await compute_cooccurrence(session)
+        await session.execute(delete(TagCooccurrence))
+        for start in range(0, pairs.nnz, settings.COOCCURRENCE_CHUNK_SIZE):
+            end = start + settings.COOCCURRENCE_CHUNK_SIZE
+            await session.execute(
+                insert(TagCooccurrence),
+                [
+                    {"tag_a": tag_a, "tag_b": tag_b, "image_count": image_count}
+                    for tag_a, tag_b, image_count in zip(
+                        tag_names[pairs.row[start:end]].tolist(),
+                        tag_names[pairs.col[start:end]].tolist(),
+                        pairs.data[start:end].tolist(),
+                    )
+                ],
+            )
+
+        total_images, total_tags, min_confidence = await _base_global_stats(session)
+        stmt = insert(GlobalStat).values(
+            id=GLOBAL_STATS_ID,
+            total_images=total_images,
+            total_tags=total_tags,
+            min_confidence=min_confidence,
+        )
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[GlobalStat.id],
+                set_={
+                    "total_images": stmt.excluded.total_images,
+                    "total_tags": stmt.excluded.total_tags,
+                    "min_confidence": stmt.excluded.min_confidence,
+                },
+            )
+        )
+        await session.commit()
+
+
+async def check_rollups() -> List[str]:
+    problems = []
+    async with async_session_maker() as session:
+        expected = {
+            tag_name: (occurrences, image_count, confidence_sum)
+            for tag_name, occurrences, image_count, confidence_sum in await session.execute(
+                _base_tag_stats_query()
+            )
+        }
+        result = await session.execute(select(TagStat))
+        actual = {
+            stat.tag_name: (stat.occurrence_count, stat.image_count, stat.confidence_sum)
+            for stat in result.scalars()
+        }
+
+        for tag_name in sorted(expected.keys() | actual.keys()):
+            want = expected.get(tag_name)
+            got = actual.get(tag_name)
+            if (
+                want is None
+                or got is None
+                or want[:2] != got[:2]
+                or not _close(want[2], got[2])
+            ):
+                problems.append(f"tag_stats[{tag_name}]: expected {want}, found {got}")
+
+        expected = {
+            (tag_name, bucket): (occurrences, confidence_sum)
+            for tag_name, bucket, occurrences, confidence_sum in await session.execute(
+                _base_buckets_query()
+            )
+        }
+        result = await session.execute(select(TagConfidenceBucket))
+        actual = {
+            (stat.tag_name, stat.bucket): (stat.occurrence_count, stat.confidence_sum)
+            for stat in result.scalars()
+        }
+
+        for key in sorted(expected.keys() | actual.keys()):
+            want = expected.get(key)
+            got = actual.get(key)
+            if want is None or got is None or want[0] != got[0] or not _close(want[1], got[1]):
+                problems.append(
+                    f"tag_confidence_buckets[{key}]: expected {want}, found {got}"
+                )
+
+        total_images, total_tags, min_confidence = await _base_global_stats(session)
+        global_stats = await get_global_stats(session)
+        if (global_stats.total_images, global_stats.total_tags) != (
+            total_images,
+            total_tags,
+        ):
+            problems.append(
+                f"global_stats: expected {total_images} images / {total_tags} tags, "
+                f"found {global_stats.total_images} / {global_stats.total_tags}"
+            )
+        if min_confidence is not None and (
+            global_stats.min_confidence is None
+            or global_stats.min_confidence > min_confidence
+        ):
+            problems.append(
+                f"global_stats.min_confidence {global_stats.min_confidence} "
+                f"is above the lowest stored confidence {min_confidence}"
+            )
+
+        tag_names, pairs = await compute_cooccurrence(session)
+        expected = dict(
+            zip(
+                zip(tag_names[pairs.row].tolist(), tag_names[pairs.col].tolist()),
+                pairs.data.tolist(),
+            )
+        )
+        result = await session.execute(
+            select(
+                TagCooccurrence.tag_a,
+                TagCooccurrence.tag_b,
+                TagCooccurrence.image_count,
+            )
+        )
+        actual = {(tag_a, tag_b): image_count for tag_a, tag_b, image_count in result}
+        problems.extend(_compare_counts("tag_cooccurrence", expected, actual))
+
+        result = await session.execute(_base_upload_hours_query())
+        expected = {hour: image_count for hour, image_count in result}
+        result = await session.execute(
+            select(UploadHourStat.hour, UploadHourStat.image_count)
+        )
+        actual = {hour: image_count for hour, image_count in result}
+        problems.extend(_compare_counts("upload_hour_stats", expected, actual))
+
+        result = await session.execute(_base_tag_hours_query())
+        expected = {(tag_name, hour): count for tag_name, hour, count in result}
+        result = await session.execute(
+            select(TagHourStat.tag_name, TagHourStat.hour, TagHourStat.occurrence_count)
+        )
+        actual = {(tag_name, hour): count for tag_name, hour, count in result}
+        problems.extend(_compare_counts("tag_hour_stats", expected, actual))
+
+        # Top tags answered from the histogram must match the GROUP BY query
+        # at every threshold it claims to answer.
+        await tag_histogram.refresh()
+        for threshold in range(0, BUCKET_MAX + 1):
+            column = tag_histogram.column(threshold, global_stats.min_confidence)
+            want = await top_tags_sql(session, threshold, len(tag_histogram.tag_names))
+            got = tag_histogram.rank(column, len(tag_histogram.tag_names))
+            if [row[:2] + row[3:] for row in want] != [
+                row[:2] + row[3:] for row in got
+            ] or not all(_close(w[2], g[2]) for w, g in zip(want, got)):
+                problems.append(f"top tags at min_confidence={threshold} differ from SQL")
+
+    return problems
+
+
+async def main(command: str) -> int:
+    if command == "rebuild":
+        await rebuild_rollups()
+        logger.info("Rollups rebuilt")
+
+    problems = await check_rollups()
+    for problem in problems:
+        logger.error(problem)
+    logger.info(f"Rollup check finished with {len(problems)} mismatches")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+
+    raise SystemExit(asyncio.run(main(args.command)))
@@ -0,0 +1,119 @@
+"""In-process catalog of the sample images.
+
+The samples are a handful of rows that only change when ``/sample-images/load``
+inserts new ones, so each worker keeps them parsed in memory: the listing
+is prebuilt and each sample's tags are sorted by confidence once. A
+threshold query is then a binary search for how long a prefix of those
+tags to return. ``/load`` bumps a Redis generation, which other workers
+compare against on their next request to know they must reload.
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+
+from app.database import async_session_maker
+from app.models import SampleImage
+from app.redis_client import bump_generation, get_generation
+
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = "sample_images_version"
+PRIMARY_CONFIDENCE = 60.0
+
+
+class SampleEntry:
+    def __init__(self, sample: SampleImage):
+        tags_data = json.loads(sample.tags_json) if sample.tags_json else []
+        # A stable sort keeps equal confidences in stored order, as
+        # get_optimal_tags does.
+        self.tags = sorted(
+            (
+                {
+                    "tag_name": tag["tag"]["en"],
+                    "confidence": tag.get("confidence", 0),
+                    "is_primary": tag.get("confidence", 0) > PRIMARY_CONFIDENCE,
+                }
+                for tag in tags_data
+            ),
+            key=lambda tag: tag["confidence"],
+            reverse=True,
+        )
+        # Negated so the keys ascend, as bisect expects.
+        self.keys = [-tag["confidence"] for tag in self.tags]
+        self.primary_count = bisect.bisect_left(self.keys, -PRIMARY_CONFIDENCE)
+        self.is_active = bool(sample.is_active)
+        self.summary = {
+            "id": sample.id,
+            "filename": sample.filename,
+            "image_preview_url": sample.image_preview_url,
+            "image_full_url": sample.image_full_url,
+            "description": sample.description,
+            "tags_count": len(self.tags),
+        }
+
+    def analyze(self, confidence_threshold: float) -> dict:
+        count = bisect.bisect_right(self.keys, -confidence_threshold)
+        tags = self.tags[:count]
+        return {
+            "image_id": f"sample_{self.summary['id']}",
+            "filename": self.summary["filename"],
+            "total_tags": count,
+            "tags": tags,
+            "primary_tags": tags[: self.primary_count],
+            "is_sample": True,
+        }
+
+
+class SampleCatalog:
+    def __init__(self):
+        self.samples: Dict[int, SampleEntry] = {}
+        self.listing: List[dict] = []
+        self.generation: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, generation: Optional[str]) -> None:
+        async with self._lock:
+            if generation is not None and generation == self.generation:
+                # Another request reloaded it while this one waited.
+                return
+
+            async with async_session_maker() as session:
+                result = await session.execute(
+                    select(SampleImage).order_by(SampleImage.id)
+                )
+                samples = {
+                    sample.id: SampleEntry(sample) for sample in result.scalars()
+                }
+
+            self.samples = samples
+            self.listing = [
+                entry.summary for entry in samples.values() if entry.is_active
+            ]
+            self.generation = generation
+
+    async def load(self) -> None:
+        await self.refresh(await get_generation(GENERATION_KEY))
+        logger.info(f"Loaded {len(self.samples)} sample images")
+
+    async def sync(self) -> Optional[str]:
+        """Reload if another worker changed the samples; the current generation."""
+        generation = await get_generation(GENERATION_KEY)
+        if generation is not None and generation != self.generation:
+            await self.refresh(generation)
+        return generation
+
+    async def changed(self) -> None:
+        await self.refresh(await bump_generation(GENERATION_KEY))
+
+    def get(self, sample_id: int) -> Optional[SampleEntry]:
+        return self.samples.get(sample_id)
+
+
+sample_catalog = SampleCatalog()
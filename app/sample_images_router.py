@@ -1,99 +1,42 @@
-import json
-
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request
 from sqlalchemy import insert, select
 
 from app.models import SampleImage
 from app.database import async_session_maker
+from app.sample_catalog import sample_catalog
 from app.sample_images import SAMPLE_IMAGES
-from app.redis_client import get_cached_data, set_cached_data
+from app.http_cache import make_etag, matching_etag, not_modified, with_cache_headers
+from app.responses import FastJSONResponse
 
 router = APIRouter(prefix="/sample-images", tags=["Sample Images"])
 
 
 @router.get("/")
-async def get_sample_images():
-    cached = get_cached_data("sample_images_list")
-    if cached:
-        print("cached")
-        return cached
-
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(SampleImage)
-            .where(SampleImage.is_active == True)
-            .order_by(SampleImage.id)
-        )
-        samples = result.scalars().all()
+async def get_sample_images(request: Request):
+    generation = await sample_catalog.sync()
+    etag = make_etag("s", generation) if generation is not None else None
+    matched = matching_etag(request, etag)
+    if matched:
+        return not_modified(matched)
 
-        response_data = [
-            {
-                "id": sample.id,
-                "filename": sample.filename,
-                "image_preview_url": sample.image_preview_url,
-                "image_full_url": sample.image_full_url,
-                "description": sample.description,
-                "tags_count": (
-                    len(json.loads(sample.tags_json)) if sample.tags_json else 0
-                ),
-            }
-            for sample in samples
-        ]
-
-        set_cached_data("sample_images_list", response_data)
-        print("not cached")
-        return response_data
+    return with_cache_headers(FastJSONResponse(sample_catalog.listing), etag)
 
 
 @router.post("/{sample_id}/analyze")
-async def analyze_sample_image(sample_id: int, confidence_threshold: float = 30.0):
-    cache_key = f"sample_analysis_{sample_id}_{confidence_threshold}"
-    cached = get_cached_data(cache_key)
-    if cached:
-        return cached
-
-    async with async_session_maker() as session:
-        result = await session.execute(
-            select(SampleImage).where(SampleImage.id == sample_id)
-        )
-        sample = result.scalar_one_or_none()
+async def analyze_sample_image(
+    sample_id: int, confidence_threshold: float = Query(30.0, allow_inf_nan=False)
+):
+    await sample_catalog.sync()
+    sample = sample_catalog.get(sample_id)
+    if sample is None:
+        raise HTTPException(status_code=404, detail="Sample image not found")
 
-        if not sample:
-            raise HTTPException(status_code=404, detail="Sample image not found")
-
-        tags_data = json.loads(sample.tags_json)
-
-        def get_optimal_tags(tags_data, confidence_threshold):
-            filtered_tags = []
-            for tag in tags_data:
-                confidence = tag.get("confidence", 0)
-                if confidence >= confidence_threshold:
-                    filtered_tags.append(
-                        {
-                            "tag_name": tag["tag"]["en"],
-                            "confidence": confidence,
-                            "is_primary": confidence > 60.0,
-                        }
-                    )
-            filtered_tags.sort(key=lambda x: x["confidence"], reverse=True)
-            return filtered_tags
-
-        optimal_tags = get_optimal_tags(tags_data, confidence_threshold)
-
-        response_data = {
-            "image_id": f"sample_{sample.id}",
-            "filename": sample.filename,
-            "total_tags": len(optimal_tags),
-            "tags": optimal_tags,
-            "primary_tags": [tag for tag in optimal_tags if tag["is_primary"]],
-            "is_sample": True,
-        }
-        set_cached_data(cache_key, response_data, expire=86400)
-        return response_data
+    return FastJSONResponse(sample.analyze(confidence_threshold))
 
 
 @router.post("/load")
 async def load_sample_images():
+    inserted = 0
     async with async_session_maker() as session:
         for sample_data in SAMPLE_IMAGES:
             existing = await session.execute(
@@ -104,5 +47,9 @@ async def load_sample_images():
             if not existing.scalar_one_or_none():
                 stmt = insert(SampleImage).values(**sample_data)
                 await session.execute(stmt)
+                inserted += 1
 
         await session.commit()
+
+    if inserted:
+        await sample_catalog.changed()
@@ -0,0 +1,64 @@
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from app.database import async_session_maker
+from app.models import Tag
+
+
+class TagDictionary:
+    """In-process (name, language) → id cache over the ``tags`` table.
+
+    Tag ids never change once created, so cached entries never go stale.
+    Unknown names are created in their own committed transaction, which
+    keeps the ids valid even if the upload that needed them rolls back.
+    """
+
+    def __init__(self):
+        self.ids: Dict[Tuple[str, str], int] = {}
+
+    async def get_or_create(
+        self, names: Iterable[str], language: str
+    ) -> Dict[str, int]:
+        names = set(names)
+        missing = sorted(name for name in names if (name, language) not in self.ids)
+
+        if missing:
+            async with async_session_maker() as session:
+                await session.execute(
+                    insert(Tag).on_conflict_do_nothing(
+                        index_elements=["name", "language"]
+                    ),
+                    [{"name": name, "language": language} for name in missing],
+                )
+                result = await session.execute(
+                    select(Tag.id, Tag.name).where(
+                        Tag.name.in_(missing), Tag.language == language
+                    )
+                )
+                created = result.all()
+                await session.commit()
+
+            for tag_id, name in created:
+                self.ids[name, language] = tag_id
+
+        return {name: self.ids[name, language] for name in names}
+
+
+async def lookup_tag_ids(session, names: Iterable[str]) -> Dict[str, List[int]]:
+    """Ids of every language's tag for each of ``names``."""
+    tag_ids = {}
+    names = list(names)
+    if not names:
+        return tag_ids
+
+    result = await session.execute(
+        select(Tag.name, Tag.id).where(Tag.name.in_(names))
+    )
+    for name, tag_id in result:
+        tag_ids.setdefault(name, []).append(tag_id)
+    return tag_ids
+
+
+tag_dictionary = TagDictionary()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import and_, exists, func, or_, select
+from sqlalchemy.orm import aliased
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models import ImageTag, Tag, TagStat
+from app.tag_dictionary import lookup_tag_ids
+
+
+logger = logging.getLogger(__name__)
+
+# (tag_name, min_confidence)
+SearchTerm = Tuple[str, float]
+
+
+def rank_postings(
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]],
+    all_terms: List[SearchTerm],
+    any_terms: List[SearchTerm],
+    none_terms: List[SearchTerm],
+) -> Tuple[np.ndarray, np.ndarray]:
+    ids = []
+    scores = []
+    required = []
+    optional = []
+
+    for terms, is_required in ((all_terms, True), (any_terms, False)):
+        for tag_name, min_confidence in terms:
+            image_ids, confidences = postings[tag_name]
+            keep = confidences >= min_confidence
+            ids.append(image_ids[keep])
+            scores.append(confidences[keep])
+            required.append(np.full(keep.sum(), is_required))
+            optional.append(np.full(keep.sum(), not is_required))
+
+    if not ids:
+        return np.empty(0, dtype=np.int64), np.empty(0)
+
+    matched_ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+    totals = np.bincount(inverse, weights=np.concatenate(scores))
+    matched = np.bincount(inverse, weights=np.concatenate(required)) == len(all_terms)
+    if any_terms:
+        matched &= np.bincount(inverse, weights=np.concatenate(optional)) > 0
+
+    for tag_name, min_confidence in none_terms:
+        image_ids, confidences = postings[tag_name]
+        excluded = image_ids[confidences >= min_confidence]
+        matched &= ~np.isin(matched_ids, excluded, assume_unique=True)
+
+    matched_ids, totals = matched_ids[matched], totals[matched]
+    order = np.lexsort((-matched_ids, -totals))
+    return matched_ids[order], totals[order]
+
+
+async def search_tags_sql(
+    session,
+    all_terms: List[SearchTerm],
+    any_terms: List[SearchTerm],
+    none_terms: List[SearchTerm],
+    limit: int,
+    offset: int = 0,
+) -> List[Tuple[int, float]]:
+    tag_ids = await lookup_tag_ids(
+        session, [tag_name for tag_name, _ in all_terms + any_terms + none_terms]
+    )
+
+    def ids(tag_names):
+        return [
+            tag_id for tag_name in tag_names for tag_id in tag_ids.get(tag_name, [])
+        ]
+
+    def matches(model, terms):
+        return or_(
+            *(
+                and_(
+                    model.tag_id.in_(ids([tag_name])),
+                    model.confidence >= min_confidence,
+                )
+                for tag_name, min_confidence in terms
+            )
+        )
+
+    score = func.sum(ImageTag.confidence)
+    stmt = (
+        select(ImageTag.image_id, score.label("score"))
+        .where(matches(ImageTag, all_terms + any_terms))
+        .group_by(ImageTag.image_id)
+        .order_by(score.desc(), ImageTag.image_id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+
+    if all_terms:
+        all_names = [tag_name for tag_name, _ in all_terms]
+        stmt = stmt.having(
+            func.count().filter(ImageTag.tag_id.in_(ids(all_names))) == len(all_names)
+        )
+    if any_terms:
+        any_names = [tag_name for tag_name, _ in any_terms]
+        stmt = stmt.having(
+            func.count().filter(ImageTag.tag_id.in_(ids(any_names))) > 0
+        )
+    if none_terms:
+        excluded = aliased(ImageTag)
+        stmt = stmt.where(
+            ~exists().where(
+                excluded.image_id == ImageTag.image_id, matches(excluded, none_terms)
+            )
+        )
+
+    result = await session.execute(stmt)
+    return [(image_id, score) for image_id, score in result]
+
+
+class PostingListCache:
+    """Posting lists for the most frequent tags, kept sorted by image id.
+
+    Queries that only mention cached tags are answered in-process from numpy
+    arrays; the lists are reloaded every SEARCH_CACHE_TTL seconds, so results
+    can lag new uploads by at most that long.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def covers(self, tag_names) -> bool:
+        return bool(self.postings) and all(
+            tag_name in self.postings for tag_name in tag_names
+        )
+
+    def search(
+        self,
+        all_terms: List[SearchTerm],
+        any_terms: List[SearchTerm],
+        none_terms: List[SearchTerm],
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return rank_postings(self.postings, all_terms, any_terms, none_terms)
+
+    async def refresh(self) -> None:
+        postings = {}
+        async with async_session_maker() as session:
+            result = await session.execute(
+                select(TagStat.tag_name)
+                .order_by(TagStat.occurrence_count.desc())
+                .limit(settings.SEARCH_CACHE_HOT_TAGS)
+            )
+            for tag_name in result.scalars().all():
+                rows = await session.execute(
+                    select(ImageTag.image_id, ImageTag.confidence)
+                    .join(Tag, Tag.id == ImageTag.tag_id)
+                    .where(Tag.name == tag_name)
+                    .order_by(ImageTag.image_id)
+                )
+                rows = rows.all()
+                postings[tag_name] = (
+                    np.array([row[0] for row in rows], dtype=np.int64),
+                    np.array([row[1] for row in rows], dtype=np.float64),
+                )
+
+        self.postings = postings
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Error refreshing posting list cache: {str(e)}")
+            await asyncio.sleep(settings.SEARCH_CACHE_TTL)
+
+    def start(self) -> None:
+        if settings.SEARCH_CACHE_HOT_TAGS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+posting_cache = PostingListCache()
@@ -0,0 +1,215 @@
+"""Interchangeable sources of image tags, picked with ``TAGGING_BACKEND``.
+
+- ``imagga``: the real API, through the rate-limited ``imagga_client``.
+- ``record``: Imagga, saving every response under ``TAGGING_RECORD_DIR``.
+- ``replay``: serves recorded responses from disk, never calling Imagga.
+- ``synthetic``: deterministic tags from the image bytes after a random
+  delay, for load tests that should measure only our own overhead.
+
+Every backend answers in Imagga's response format and reports failures as
+``ImaggaAPIError``, so callers don't care which one is active.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+
+from typing import Optional, Protocol
+
+from app.config import settings
+from app.imagga_client import ImaggaAPIError, imagga_client
+from app.tagging_stub import build_tags
+
+
+logger = logging.getLogger(__name__)
+
+
+class TaggingBackend(Protocol):
+    async def start(self) -> None: ...
+
+    async def close(self) -> None: ...
+
+    async def tag_image(
+        self,
+        image,
+        filename: str,
+        content_type: str,
+        language: str = "en",
+        key: Optional[str] = None,
+    ) -> dict: ...
+
+
+def read_image(image) -> bytes:
+    """Bytes of an in-memory payload or a spooled file, leaving it rewound."""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+
+    start = image.tell()
+    data = image.read()
+    image.seek(start)
+    return data
+
+
+def recording_path(directory: str, key: str, language: str) -> str:
+    return os.path.join(directory, f"{key}_{language}.json")
+
+
+async def _image_key(image, key: Optional[str]) -> str:
+    # Callers pass the image hash; hash the bytes the same way if they don't.
+    if key is not None:
+        return key
+    data = await asyncio.to_thread(read_image, image)
+    return hashlib.sha256(data).hexdigest()
+
+
+class RecordingBackend:
+    def __init__(self, backend: TaggingBackend, directory: str):
+        self.backend = backend
+        self.directory = directory
+
+    def _save(self, path: str, response: dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, so replay never sees half a file.
+        with open(f"{path}.tmp", "w") as recording:
+            json.dump(response, recording)
+        os.replace(f"{path}.tmp", path)
+
+    async def start(self) -> None:
+        await self.backend.start()
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+    async def tag_image(
+        self,
+        image,
+        filename: str,
+        content_type: str,
+        language: str = "en",
+        key: Optional[str] = None,
+    ) -> dict:
+        key = await _image_key(image, key)
+        response = await self.backend.tag_image(
+            image, filename, content_type, language=language, key=key
+        )
+        path = recording_path(self.directory, key, language)
+        await asyncio.to_thread(self._save, path, response)
+        return response
+
+
+class ReplayBackend:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _load(self, path: str) -> Optional[dict]:
+        try:
+            with open(path) as recording:
+                return json.load(recording)
+        except FileNotFoundError:
+            return None
+
+    async def start(self) -> None:
+        if not os.path.isdir(self.directory):
+            logger.warning(f"Replay directory {self.directory} does not exist")
+
+    async def close(self) -> None:
+        pass
+
+    async def tag_image(
+        self,
+        image,
+        filename: str,
+        content_type: str,
+        language: str = "en",
+        key: Optional[str] = None,
+    ) -> dict:
+        key = await _image_key(image, key)
+        path = recording_path(self.directory, key, language)
+        response = await asyncio.to_thread(self._load, path)
+        if response is None:
+            raise ImaggaAPIError(404, f"No recorded response for image {key}")
+        return response
+
+
+def sample_latency(
+    distribution: str, mean: float, spread: float, rng: random.Random
+) -> float:
+    """A delay in seconds with the given mean.
+
+    ``spread`` is the half-width for ``uniform`` and the log-space sigma for
+    ``lognormal``; ``constant`` and ``exponential`` ignore it.
+    """
+    if mean <= 0:
+        return 0.0
+    if distribution == "constant":
+        return mean
+    if distribution == "uniform":
+        return rng.uniform(max(mean - spread, 0.0), mean + spread)
+    if distribution == "exponential":
+        return rng.expovariate(1 / mean)
+    return rng.lognormvariate(math.log(mean) - spread**2 / 2, spread)
+
+
+class SyntheticBackend:
+    def __init__(
+        self,
+        distribution: str,
+        mean: float,
+        spread: float,
+        error_rate: float,
+        seed: Optional[int] = None,
+    ):
+        self.distribution = distribution
+        self.mean = mean
+        self.spread = spread
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def tag_image(
+        self,
+        image,
+        filename: str,
+        content_type: str,
+        language: str = "en",
+        key: Optional[str] = None,
+    ) -> dict:
+        await asyncio.sleep(
+            sample_latency(self.distribution, self.mean, self.spread, self.rng)
+        )
+        if self.rng.random() < self.error_rate:
+            raise ImaggaAPIError(503, "Synthetic tagging failure")
+
+        data = await asyncio.to_thread(read_image, image)
+        return {
+            "result": {"tags": build_tags(data, language)},
+            "status": {"text": "", "type": "success"},
+        }
+
+
+def create_backend(name: str) -> TaggingBackend:
+    if name == "record":
+        return RecordingBackend(imagga_client, settings.TAGGING_RECORD_DIR)
+    if name == "replay":
+        return ReplayBackend(settings.TAGGING_RECORD_DIR)
+    if name == "synthetic":
+        return SyntheticBackend(
+            settings.TAGGING_SYNTHETIC_LATENCY,
+            settings.TAGGING_SYNTHETIC_LATENCY_MEAN,
+            settings.TAGGING_SYNTHETIC_LATENCY_SPREAD,
+            settings.TAGGING_SYNTHETIC_ERROR_RATE,
+            settings.TAGGING_SYNTHETIC_SEED,
+        )
+    return imagga_client
+
+
+tagging_backend = create_backend(settings.TAGGING_BACKEND)
@@ -0,0 +1,83 @@
+import json
+
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session_maker
+from app.models import TaggingResult
+from app.redis_client import get_many_cached, set_cached_data, set_many_cached
+
+
+def _cache_key(image_hash: str, language: str) -> str:
+    return f"tagging_result_{image_hash}_{language}"
+
+
+async def cache_tagging_result(image_hash: str, language: str, tags: List[dict]):
+    await set_cached_data(
+        _cache_key(image_hash, language),
+        tags,
+        expire=settings.TAGGING_RESULT_CACHE_TTL,
+    )
+
+
+async def cache_tagging_results(results: Dict[str, List[dict]], language: str):
+    await set_many_cached(
+        {
+            _cache_key(image_hash, language): tags
+            for image_hash, tags in results.items()
+        },
+        expire=settings.TAGGING_RESULT_CACHE_TTL,
+    )
+
+
+async def get_tagging_result(image_hash: str, language: str) -> Optional[List[dict]]:
+    results = await get_tagging_results([image_hash], language)
+    return results.get(image_hash)
+
+
+async def get_tagging_results(
+    image_hashes: Iterable[str], language: str
+) -> Dict[str, List[dict]]:
+    keys = {_cache_key(image_hash, language): image_hash for image_hash in image_hashes}
+    cached = await get_many_cached(keys, cache="tagging_results")
+    results = {keys[key]: tags for key, tags in cached.items()}
+
+    missing = [image_hash for image_hash in keys.values() if image_hash not in results]
+    if not missing:
+        return results
+
+    async with async_session_maker() as session:
+        rows = await session.execute(
+            select(TaggingResult.image_hash, TaggingResult.tags_json).where(
+                TaggingResult.image_hash.in_(missing),
+                TaggingResult.language == language,
+            )
+        )
+        loaded = {image_hash: json.loads(tags_json) for image_hash, tags_json in rows}
+
+    await cache_tagging_results(loaded, language)
+
+    results.update(loaded)
+    return results
+
+
+async def save_tagging_results(session: AsyncSession, results: List[dict]) -> None:
+    if not results:
+        return
+
+    await session.execute(
+        insert(TaggingResult).on_conflict_do_nothing(
+            index_elements=["image_hash", "language"]
+        ),
+        [
+            {
+                "image_hash": result["image_hash"],
+                "language": result["language"],
+                "tags_json": json.dumps(result["tags"]),
+            }
+            for result in results
+        ],
+    )
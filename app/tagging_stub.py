@@ -0,0 +1,153 @@
+"""Local stand-in for the Imagga ``/v2/tags`` endpoint.
+
+Run with ``python -m app.tagging_stub --port 8765`` and point
+``IMAGGA_API_URL`` at ``http://127.0.0.1:8765/v2/tags``. Tags are derived
+from the image bytes, so the same file always gets the same answer.
+
+Faults can be injected with the command line flags or at runtime with
+``POST /faults`` (a JSON object of config keys); ``GET /faults`` also
+reports how many tagging requests were served and rejected.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import random
+import time
+
+from aiohttp import web
+
+
+VOCABULARY = [
+    "animal", "architecture", "beach", "bird", "building", "car", "cat",
+    "city", "cloud", "dog", "field", "flower", "food", "forest", "fruit",
+    "grass", "landscape", "light", "mountain", "nature", "ocean", "outdoor",
+    "people", "plant", "portrait", "road", "sea", "sky", "snow", "street",
+    "summer", "sunset", "travel", "tree", "urban", "water", "winter", "wood",
+]
+
+
+def build_tags(image_data: bytes, language: str = "en", count: int = 15) -> list:
+    digest = hashlib.sha256(image_data).digest()
+    tags = []
+    seen = set()
+    for i in range(count):
+        word = VOCABULARY[digest[i] % len(VOCABULARY)]
+        if word in seen:
+            continue
+
+        seen.add(word)
+        confidence = round(100 - i * 6.5 - digest[i + count] / 64, 2)
+        tags.append({"confidence": confidence, "tag": {language: word}})
+
+    return tags
+
+
+def _rate_limited(app: web.Application) -> bool:
+    config, bucket = app["config"], app["bucket"]
+    if not config["rate_limit"]:
+        return False
+
+    now = time.monotonic()
+    bucket["tokens"] = min(
+        config["rate_limit"],
+        bucket["tokens"] + (now - bucket["updated"]) * config["rate_limit"],
+    )
+    bucket["updated"] = now
+    if bucket["tokens"] < 1:
+        return True
+    bucket["tokens"] -= 1
+    return False
+
+
+async def tags_handler(request: web.Request) -> web.Response:
+    config, counts = request.app["config"], request.app["counts"]
+    counts["requests"] += 1
+    if config["latency"]:
+        await asyncio.sleep(config["latency"])
+
+    if _rate_limited(request.app):
+        counts["rate_limited"] += 1
+        return web.json_response(
+            {"status": {"text": "Too many requests", "type": "error"}},
+            status=429,
+            headers={"Retry-After": "1"},
+        )
+    if config["down"] or random.random() < config["error_rate"]:
+        counts["errors"] += 1
+        return web.json_response(
+            {"status": {"text": "Injected failure", "type": "error"}},
+            status=config["error_status"],
+        )
+
+    form = await request.post()
+    image = form.get("image")
+    if image is None:
+        return web.json_response(
+            {"status": {"text": "No image provided", "type": "error"}}, status=400
+        )
+
+    image_data = image.file.read() if hasattr(image, "file") else bytes(image)
+    language = request.query.get("language", "en")
+
+    return web.json_response(
+        {
+            "result": {"tags": build_tags(image_data, language)},
+            "status": {"text": "", "type": "success"},
+        }
+    )
+
+
+async def faults_handler(request: web.Request) -> web.Response:
+    config = request.app["config"]
+    if request.method == "POST":
+        changes = await request.json()
+        unknown = set(changes) - set(config)
+        if unknown:
+            return web.json_response(
+                {"detail": f"Unknown fault settings: {sorted(unknown)}"}, status=400
+            )
+        config.update(changes)
+    return web.json_response({**config, **request.app["counts"]})
+
+
+def create_app(
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 503,
+    rate_limit: float = 0.0,
+) -> web.Application:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app["config"] = {
+        "latency": latency,
+        # Share of requests answered with error_status
+        "error_rate": error_rate,
+        "error_status": error_status,
+        # Fail every request, as during an outage
+        "down": False,
+        # Requests per second before answering 429; 0 disables
+        "rate_limit": rate_limit,
+    }
+    app["bucket"] = {"tokens": rate_limit, "updated": time.monotonic()}
+    app["counts"] = {"requests": 0, "errors": 0, "rate_limited": 0}
+    app.router.add_post("/v2/tags", tags_handler)
+    app.router.add_get("/faults", faults_handler)
+    app.router.add_post("/faults", faults_handler)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(args.latency, args.error_rate, args.error_status, args.rate_limit),
+        host=args.host,
+        port=args.port,
+    )
@@ -0,0 +1,144 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Image, ImageTag, Tag, TagHourStat, UploadHourStat
+from app.rollups import upload_hour
+
+
+BUCKET_STEPS = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+
+def as_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def truncate(moment: datetime, bucket: str) -> datetime:
+    """Python twin of ``date_trunc(bucket, moment, 'UTC')``."""
+    moment = upload_hour(moment)
+    if bucket in ("day", "week"):
+        moment = moment.replace(hour=0)
+    if bucket == "week":
+        moment -= timedelta(days=moment.weekday())
+    return moment
+
+
+async def _from_hour_stats(
+    session: AsyncSession,
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    tags: List[str],
+    images: Counter,
+    tag_counts: dict,
+) -> None:
+    period = func.date_trunc(bucket, UploadHourStat.hour, "UTC")
+    result = await session.execute(
+        select(period, func.sum(UploadHourStat.image_count))
+        .where(UploadHourStat.hour >= start, UploadHourStat.hour < end)
+        .group_by(period)
+    )
+    for period_start, image_count in result:
+        images[period_start] += image_count
+
+    if tags:
+        period = func.date_trunc(bucket, TagHourStat.hour, "UTC")
+        result = await session.execute(
+            select(TagHourStat.tag_name, period, func.sum(TagHourStat.occurrence_count))
+            .where(
+                TagHourStat.tag_name.in_(tags),
+                TagHourStat.hour >= start,
+                TagHourStat.hour < end,
+            )
+            .group_by(TagHourStat.tag_name, period)
+        )
+        for tag_name, period_start, count in result:
+            tag_counts[tag_name][period_start] += count
+
+
+async def _from_images(
+    session: AsyncSession,
+    bucket: str,
+    start: datetime,
+    end: datetime,
+    tags: List[str],
+    images: Counter,
+    tag_counts: dict,
+) -> None:
+    period = func.date_trunc(bucket, Image.upload_date, "UTC")
+    in_range = (Image.upload_date >= start, Image.upload_date < end)
+    result = await session.execute(
+        select(period, func.count(Image.id)).where(*in_range).group_by(period)
+    )
+    for period_start, image_count in result:
+        images[period_start] += image_count
+
+    if tags:
+        result = await session.execute(
+            select(Tag.name, period, func.count(ImageTag.id))
+            .join(Image, Image.id == ImageTag.image_id)
+            .join(Tag, Tag.id == ImageTag.tag_id)
+            .where(Tag.name.in_(tags), *in_range)
+            .group_by(Tag.name, period)
+        )
+        for tag_name, period_start, count in result:
+            tag_counts[tag_name][period_start] += count
+
+
+async def load_trends(
+    session: AsyncSession,
+    bucket: str,
+    date_from: datetime,
+    date_to: datetime,
+    tags: List[str],
+) -> List[dict]:
+    """Uploads and tag occurrences per bucket in ``[date_from, date_to)``.
+
+    Whole hours come from the hourly rollups; the partial hours at either
+    end of the range are counted from images directly, which the BRIN
+    index on upload_date keeps to a few block ranges.
+    """
+    images = Counter()
+    tag_counts = {tag_name: Counter() for tag_name in tags}
+
+    first_hour = upload_hour(date_from)
+    if first_hour < date_from:
+        first_hour += BUCKET_STEPS["hour"]
+    last_hour = upload_hour(date_to)
+
+    if first_hour < last_hour:
+        await _from_hour_stats(
+            session, bucket, first_hour, last_hour, tags, images, tag_counts
+        )
+        raw_ranges = [(date_from, first_hour), (last_hour, date_to)]
+    else:
+        raw_ranges = [(date_from, date_to)]
+
+    for start, end in raw_ranges:
+        if start < end:
+            await _from_images(session, bucket, start, end, tags, images, tag_counts)
+
+    series = []
+    period_start = truncate(date_from, bucket)
+    while period_start < date_to:
+        series.append(
+            {
+                "bucket_start": period_start,
+                "images": images[period_start],
+                "tags": {
+                    tag_name: counts[period_start]
+                    for tag_name, counts in tag_counts.items()
+                },
+            }
+        )
+        period_start += BUCKET_STEPS[bucket]
+    return series
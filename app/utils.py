@@ -1,15 +1,54 @@
+import asyncio
+import base64
+import binascii
 import hashlib
+import mimetypes
+import os
+import random
+import tempfile
+import threading
+import zipfile
 
-from typing import List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from fastapi import UploadFile
+from PIL import Image as PILImage, UnidentifiedImageError
 from sqlalchemy import select
 
+from app.config import settings
 from app.database import async_session_maker
-from sqlalchemy.orm import Session
-from app.models import Image
+from app.hash_filter import known_hashes
+from app.models import Image, ImageTag, Tag
+from app.phash_index import phash_index, to_signed
+
+
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+class UploadTooLargeError(Exception):
+    pass
+
+
+class BatchTooLargeError(Exception):
+    pass
+
+
+class ByteBudget:
+    """Uncompressed bytes a batch upload may still spool, across all its files."""
+
+    def __init__(self, max_bytes: int):
+        self.remaining = max_bytes
+        # Zip entries are spooled in worker threads.
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> None:
+        with self._lock:
+            self.remaining -= size
+            if self.remaining < 0:
+                raise BatchTooLargeError(size)
 
 
 def get_optimal_tags(
-    tags_data: List[dict], confidence_threshold: float = 30.0
+    tags_data: List[dict], confidence_threshold: float = 30.0, language: str = "en"
 ) -> List[dict]:
     filtered_tags = []
 
@@ -19,7 +58,7 @@ def get_optimal_tags(
         if confidence >= confidence_threshold:
             filtered_tags.append(
                 {
-                    "tag_name": tag["tag"]["en"],
+                    "tag_name": tag["tag"][language],
                     "confidence": confidence,
                     "is_primary": confidence > 60.0,
                 }
@@ -34,21 +73,237 @@ def calculate_image_hash(image_data: bytes) -> str:
     return hashlib.sha256(image_data).hexdigest()
 
 
+def calculate_perceptual_hash(image_file) -> Optional[int]:
+    # 64-bit dHash: compare horizontally adjacent pixels of a 9x8 grayscale
+    # thumbnail. draft() lets the JPEG decoder skip most of the full-size work.
+    try:
+        with PILImage.open(image_file) as image:
+            image.draft("L", (64, 64))
+            pixels = (
+                image.convert("L")
+                .resize((9, 8), PILImage.Resampling.LANCZOS)
+                .tobytes()
+            )
+    except (
+        UnidentifiedImageError,
+        PILImage.DecompressionBombError,
+        OSError,
+        ValueError,
+    ):
+        return None
+    finally:
+        image_file.seek(0)
+
+    perceptual_hash = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            perceptual_hash = (perceptual_hash << 1) | (left > right)
+
+    return to_signed(perceptual_hash)
+
+
+def _consume_chunk(hasher, spool, chunk: bytes) -> None:
+    hasher.update(chunk)
+    spool.write(chunk)
+
+
+async def spool_upload(
+    file: UploadFile, budget: Optional[ByteBudget] = None
+) -> Tuple[tempfile.SpooledTemporaryFile, int, str]:
+    if file.size is not None and file.size > settings.UPLOAD_MAX_SIZE:
+        raise UploadTooLargeError(file.size)
+
+    hasher = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_THRESHOLD)
+    file_size = 0
+
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > settings.UPLOAD_MAX_SIZE:
+                raise UploadTooLargeError(file_size)
+            if budget is not None:
+                budget.take(len(chunk))
+
+            await asyncio.to_thread(_consume_chunk, hasher, spool, chunk)
+    except BaseException:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool, file_size, hasher.hexdigest()
+
+
+def spool_payload(spool: tempfile.SpooledTemporaryFile, file_size: int):
+    # Small uploads never left memory, so send their bytes as-is; larger ones
+    # are real temp files that aiohttp streams from disk in chunks.
+    if file_size <= settings.UPLOAD_SPOOL_THRESHOLD:
+        return spool.read()
+    return spool
+
+
 async def check_duplicate_image(image_hash: str) -> bool:
+    if not await known_hashes.might_contain(image_hash):
+        return False
+
     async with async_session_maker() as session:
         result = await session.execute(
-            select(Image).where(Image.image_hash == image_hash)
+            select(Image.id).where(Image.image_hash == image_hash).limit(1)
         )
-        existing_image = result.scalar_one_or_none()
-        return existing_image is not None
+        return result.scalar_one_or_none() is not None
 
 
-async def get_similar_images(
-    image_hash: str, session: Session, similarity_threshold: int = 5
-) -> List[Image]:
+async def find_existing_hashes(image_hashes: Iterable[str]) -> Set[str]:
+    candidates = [
+        image_hash
+        for image_hash in image_hashes
+        if await known_hashes.might_contain(image_hash)
+    ]
+    if not candidates:
+        return set()
+
     async with async_session_maker() as session:
         result = await session.execute(
-            select(Image).where(Image.image_hash == image_hash)
+            select(Image.image_hash).where(Image.image_hash.in_(candidates))
+        )
+        return set(result.scalars().all())
+
+
+async def get_similar_images(
+    perceptual_hash: int, max_distance: int = 10
+) -> List[Tuple[int, int]]:
+    return await phash_index.search(perceptual_hash, max_distance)
+
+
+async def load_image_tags(session, image_ids: List[int]) -> Dict[int, List[dict]]:
+    tags = {}
+    if not image_ids:
+        return tags
+
+    result = await session.execute(
+        select(
+            ImageTag.image_id,
+            Tag.name,
+            ImageTag.confidence,
+            ImageTag.is_primary,
         )
-        existing_image = result.scalar_one_or_none()
-        return [existing_image] if existing_image else []
+        .join(Tag, Tag.id == ImageTag.tag_id)
+        .where(ImageTag.image_id.in_(image_ids))
+        .order_by(ImageTag.image_id, ImageTag.confidence.desc())
+    )
+    for image_id, tag_name, confidence, is_primary in result:
+        tags.setdefault(image_id, []).append(
+            {"name": tag_name, "confidence": confidence, "is_primary": is_primary}
+        )
+    return tags
+
+
+def encode_cursor(image_id: int) -> str:
+    return base64.urlsafe_b64encode(str(image_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(cursor) from e
+
+
+def jittered_backoff(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (from 0)."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def is_zip_upload(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (
+        file.filename or ""
+    ).lower().endswith(".zip")
+
+
+def _zip_entry_content_type(info: zipfile.ZipInfo) -> str:
+    return mimetypes.guess_type(os.path.basename(info.filename))[0] or ""
+
+
+def measure_zip(zip_file) -> Tuple[int, int]:
+    """Entries in a zip and the uncompressed bytes spooling them would read.
+
+    Only the central directory is read. zipfile never returns more than an
+    entry's declared size, so the byte count is an upper bound.
+    """
+    try:
+        with zipfile.ZipFile(zip_file) as archive:
+            entries = [info for info in archive.infolist() if not info.is_dir()]
+    except zipfile.BadZipFile:
+        # Reported as a single failed item once spooled.
+        return 1, 0
+    finally:
+        zip_file.seek(0)
+
+    size = sum(
+        info.file_size
+        for info in entries
+        if _zip_entry_content_type(info).startswith("image/")
+        and info.file_size <= settings.UPLOAD_MAX_SIZE
+    )
+    return len(entries), size
+
+
+def spool_zip_entries(zip_file, budget: Optional[ByteBudget] = None) -> List[dict]:
+    items = []
+
+    try:
+        with zipfile.ZipFile(zip_file) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+
+                filename = os.path.basename(info.filename)
+                content_type = _zip_entry_content_type(info)
+                item = {"filename": filename, "content_type": content_type}
+                items.append(item)
+
+                if not content_type.startswith("image/"):
+                    item["error"] = "File must be an image"
+                    continue
+                if info.file_size > settings.UPLOAD_MAX_SIZE:
+                    item["error"] = "File exceeds the upload size limit"
+                    continue
+
+                hasher = hashlib.sha256()
+                spool = tempfile.SpooledTemporaryFile(
+                    max_size=settings.UPLOAD_SPOOL_THRESHOLD
+                )
+                item["spool"] = spool
+                file_size = 0
+
+                with archive.open(info) as entry:
+                    while chunk := entry.read(settings.UPLOAD_CHUNK_SIZE):
+                        file_size += len(chunk)
+                        if file_size > settings.UPLOAD_MAX_SIZE:
+                            break
+                        if budget is not None:
+                            budget.take(len(chunk))
+                        _consume_chunk(hasher, spool, chunk)
+
+                if file_size > settings.UPLOAD_MAX_SIZE:
+                    item.pop("spool").close()
+                    item["error"] = "File exceeds the upload size limit"
+                    continue
+
+                spool.seek(0)
+                item["file_size"] = file_size
+                item["image_hash"] = hasher.hexdigest()
+                item["perceptual_hash"] = calculate_perceptual_hash(spool)
+    except BaseException:
+        close_spools(items)
+        raise
+
+    return items
+
+
+def close_spools(items: List[dict]) -> None:
+    for item in items:
+        if item.get("spool") is not None:
+            item["spool"].close()
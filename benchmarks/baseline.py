@@ -0,0 +1,100 @@
+"""Latency summaries, saved baselines and regression checks shared by benchmarks."""
+
+import json
+import os
+import platform
+import sys
+
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+
+
+# Metrics a regression is judged on, and whether bigger is better.
+GATED_METRICS = {"p95_ms": False, "throughput": True, "per_call_us": False}
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int) -> dict:
+    """Throughput and latency percentiles (ms) for one closed-loop run."""
+    latencies_ms = np.asarray(latencies or [0.0]) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(float(latencies_ms.mean()), 2),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "max_ms": round(float(latencies_ms.max()), 2),
+    }
+
+
+def median_summary(rounds: List[dict]) -> dict:
+    """Per-metric median over repeated rounds, to damp run-to-run noise."""
+    return {
+        key: round(float(np.median([summary[key] for summary in rounds])), 2)
+        for key in rounds[0]
+    }
+
+
+def save_baseline(path: str, results: Dict[str, dict], config: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as baseline:
+        json.dump(
+            {
+                "created": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "machine": platform.platform(),
+                "config": config,
+                "results": results,
+            },
+            baseline,
+            indent=2,
+        )
+    print(f"baseline saved to {path}")
+
+
+def compare_to_baseline(
+    path: str, results: Dict[str, dict], threshold: float
+) -> List[str]:
+    """Print the change against a saved baseline and list the regressions."""
+    with open(path) as baseline_file:
+        baseline = json.load(baseline_file)["results"]
+
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        # Failing fast looks like a speedup, so any rise in errors fails the
+        # comparison regardless of the threshold.
+        if result.get("errors", 0) > baseline[name].get("errors", 0):
+            before, after = baseline[name].get("errors", 0), result["errors"]
+            print(f"  {name:<24} {'errors':<12} {before:>10} -> {after:>10} REGRESSION")
+            regressions.append(f"{name} errors {before} -> {after}")
+        for metric, higher_is_better in GATED_METRICS.items():
+            if metric not in result or not baseline[name].get(metric):
+                continue
+
+            before, after = baseline[name][metric], result[metric]
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            print(
+                f"  {name:<24} {metric:<12} {before:>10} -> {after:>10} "
+                f"{change:+7.1%} {flag}"
+            )
+            if flag:
+                regressions.append(f"{name} {metric} {change:+.1%}")
+    return regressions
+
+
+def print_table(results: Dict[str, dict], columns: List[str]) -> None:
+    width = max([24, *map(len, results)])
+    print(f"  {'benchmark':<{width}}" + "".join(f"{column:>12}" for column in columns))
+    for name, result in results.items():
+        print(
+            f"  {name:<{width}}"
+            + "".join(f"{result.get(column, ''):>12}" for column in columns)
+        )
@@ -0,0 +1,112 @@
+"""Time the chunked AᵀA co-occurrence count and pair scoring on synthetic tags.
+
+Also times how long CooccurrenceMatrix takes to rebuild from the resulting
+``tag_cooccurrence`` rows, leaving out the time spent reading them.
+
+Usage: python -m benchmarks.bench_cooccurrence --images 1000000 --tags 30000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+from scipy import sparse
+
+from app.cooccurrence import (
+    CooccurrenceMatrix,
+    _incidence_chunk,
+    _pair_arrays,
+    _top,
+    score_pairs,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=1_000_000)
+    parser.add_argument("--tags", type=int, default=30_000)
+    parser.add_argument("--tags-per-image", type=int, default=10)
+    parser.add_argument("--chunk-size", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Zipf-ish tag popularity, like real tag vocabularies.
+    rng = np.random.default_rng(args.seed)
+    weights = 1.0 / np.arange(1, args.tags + 1)
+    weights /= weights.sum()
+    image_ids = np.repeat(np.arange(args.images), args.tags_per_image)
+    tag_indices = rng.choice(args.tags, size=len(image_ids), p=weights)
+    # A tag appears at most once per image.
+    _, unique = np.unique(image_ids * args.tags + tag_indices, return_index=True)
+    image_ids, tag_indices = image_ids[unique], tag_indices[unique]
+    print(f"{args.images} images, {len(image_ids)} tag rows, {args.tags} tags")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    counts = sparse.csr_matrix((args.tags, args.tags), dtype=np.int64)
+    # Chunks of whole images, as compute_cooccurrence guarantees.
+    images_per_chunk = max(1, args.chunk_size // args.tags_per_image)
+    bounds = np.searchsorted(
+        image_ids, np.arange(0, args.images + images_per_chunk, images_per_chunk)
+    )
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        chunk = _incidence_chunk(
+            image_ids[start:end], tag_indices[start:end], args.tags
+        )
+        counts = counts + (chunk.T @ chunk).astype(np.int64)
+    image_counts = counts.diagonal()
+    pairs = sparse.triu(counts, k=1).tocoo()
+    build_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"AᵀA in {build_seconds:.2f}s, {pairs.nnz} pairs, "
+        f"peak {peak / 2**20:.0f} MiB"
+    )
+
+    for sort_by in ("count", "lift", "jaccard"):
+        started = time.perf_counter()
+        keep = pairs.data >= 5
+        scores = score_pairs(
+            pairs.data[keep],
+            image_counts[pairs.row[keep]],
+            image_counts[pairs.col[keep]],
+            args.images,
+        )
+        _top(scores, sort_by, 100)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"top 100 pairs by {sort_by}: {elapsed_ms:.1f}ms")
+
+    # Rows shaped like the ones refresh streams from tag_cooccurrence.
+    tag_names = [f"tag{i:06d}" for i in range(args.tags)]
+    tag_stats = list(zip(tag_names, image_counts.tolist()))
+    pair_rows = list(
+        zip(
+            [tag_names[i] for i in pairs.row.tolist()],
+            [tag_names[i] for i in pairs.col.tolist()],
+            pairs.data.tolist(),
+        )
+    )
+    tag_index = {tag_name: i for i, tag_name in enumerate(tag_names)}
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    pair_chunks = [
+        _pair_arrays(pair_rows[start : start + args.chunk_size], tag_index)
+        for start in range(0, len(pair_rows), args.chunk_size)
+    ]
+    CooccurrenceMatrix().load(tag_stats, args.images, pair_chunks)
+    refresh_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"refresh from {len(pair_rows)} rows in {refresh_seconds:.2f}s, "
+        f"peak {peak / 2**20:.0f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,254 @@
+"""Load-test the API end to end and check it against a saved baseline.
+
+Boots app.main under uvicorn with the synthetic tagging backend (no Imagga
+calls), seeds a synthetic corpus through the batch upload endpoint, then
+drives each endpoint with a fixed number of concurrent clients and reports
+throughput and p50/p95/p99 latency. Point it at a scratch database: the
+seeded and uploaded images stay behind.
+
+Usage: python -m benchmarks.bench_endpoints --seed-images 5000 --save-baseline
+       python -m benchmarks.bench_endpoints --compare --threshold 0.2
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import subprocess
+import sys
+import time
+
+from typing import Callable, Dict, List
+
+import aiohttp
+
+from PIL import Image
+from benchmarks.baseline import (
+    compare_to_baseline,
+    median_summary,
+    print_table,
+    save_baseline,
+    summarize,
+)
+
+
+DEFAULT_BASELINE = os.path.join(
+    os.path.dirname(__file__), "baselines", "endpoints.json"
+)
+
+
+def _jpeg(size: int) -> bytes:
+    # Random noise, so every upload is a distinct image that still decodes and
+    # gets perceptually hashed like a real one.
+    image = Image.frombytes("RGB", (size, size), os.urandom(size * size * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def _image_form(size: int) -> aiohttp.FormData:
+    form = aiohttp.FormData()
+    form.add_field("file", _jpeg(size), filename="bench.jpg", content_type="image/jpeg")
+    return form
+
+
+# Each scenario opens one request; the response is read and timed by the caller.
+SCENARIOS: Dict[str, Callable] = {
+    "upload": lambda http, rng, args: http.post(
+        "/image/upload/", data=_image_form(args.image_size)
+    ),
+    "list_images": lambda http, rng, args: http.get(
+        "/image/images/", params={"limit": 50}
+    ),
+    "top_tags": lambda http, rng, args: http.get(
+        "/analytics/top-tags/",
+        params={"limit": 10, "min_confidence": rng.choice([0, 30, 50, 70])},
+    ),
+    "stats": lambda http, rng, args: http.get("/analytics/stats/"),
+    "sample_images": lambda http, rng, args: http.get("/sample-images/"),
+}
+
+
+def start_server(args) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "TAGGING_BACKEND": "synthetic",
+        "TAGGING_SYNTHETIC_LATENCY": "lognormal",
+        "TAGGING_SYNTHETIC_LATENCY_MEAN": str(args.tagging_latency),
+        "TAGGING_SYNTHETIC_SEED": str(args.seed),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(args.port),
+            "--workers",
+            str(args.workers),
+            "--log-level",
+            "warning",
+        ],
+        env=env,
+    )
+
+
+async def wait_until_ready(http: aiohttp.ClientSession, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with http.get("/") as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("API did not start in time")
+        await asyncio.sleep(0.5)
+
+
+async def seed_corpus(http: aiohttp.ClientSession, args) -> None:
+    async with http.post("/sample-images/load") as response:
+        await response.read()
+
+    started = time.perf_counter()
+    created = 0
+    for offset in range(0, args.seed_images, args.seed_batch):
+        form = aiohttp.FormData()
+        for _ in range(min(args.seed_batch, args.seed_images - offset)):
+            form.add_field(
+                "files",
+                _jpeg(args.image_size),
+                filename="seed.jpg",
+                content_type="image/jpeg",
+            )
+        async with http.post("/image/upload-batch/", data=form) as response:
+            created += (await response.json()).get("created", 0)
+    elapsed = time.perf_counter() - started
+    print(f"seeded {created} images in {elapsed:.1f}s")
+
+
+async def run_scenario(
+    http: aiohttp.ClientSession, name: str, args, rng: random.Random
+) -> dict:
+    make_request = SCENARIOS[name]
+    latencies: List[float] = []
+    errors = 0
+
+    async def client(requests: int, record: bool) -> None:
+        nonlocal errors
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                async with make_request(http, rng, args) as response:
+                    await response.read()
+                    failed = response.status >= 400
+            except aiohttp.ClientError:
+                failed = True
+            if record:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+    clients = range(args.concurrency)
+    await asyncio.gather(*(client(args.warmup, False) for _ in clients))
+
+    per_client = max(args.requests // args.concurrency, 1)
+    started = time.perf_counter()
+    await asyncio.gather(*(client(per_client, True) for _ in clients))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+async def run(args) -> Dict[str, dict]:
+    server = None if args.url else start_server(args)
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    connector = aiohttp.TCPConnector(limit=args.concurrency * 2)
+    try:
+        async with aiohttp.ClientSession(
+            base_url, connector=connector, timeout=aiohttp.ClientTimeout(total=120)
+        ) as http:
+            await wait_until_ready(http, args.startup_timeout)
+            if args.seed_images:
+                await seed_corpus(http, args)
+
+            rng = random.Random(args.seed)
+            results = {}
+            for name in args.scenarios:
+                results[name] = median_summary(
+                    [
+                        await run_scenario(http, name, args, rng)
+                        for _ in range(args.rounds)
+                    ]
+                )
+                print(
+                    f"{name}: {results[name]['throughput']} req/s, "
+                    f"p95 {results[name]['p95_ms']}ms"
+                )
+            return results
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="benchmark a running API instead of booting one")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument(
+        "--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS)
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=800, help="per scenario")
+    parser.add_argument("--warmup", type=int, default=5, help="per client")
+    parser.add_argument(
+        "--rounds", type=int, default=3, help="report the median of this many runs"
+    )
+    parser.add_argument("--seed-images", type=int, default=2000)
+    parser.add_argument("--seed-batch", type=int, default=200)
+    parser.add_argument(
+        "--image-size", type=int, default=32, help="side of the test JPEGs in pixels"
+    )
+    parser.add_argument(
+        "--tagging-latency",
+        type=float,
+        default=0.0,
+        help="mean synthetic tagging latency in seconds",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="allowed relative slowdown before failing",
+    )
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print_table(
+        results,
+        ["requests", "errors", "throughput", "p50_ms", "p95_ms", "p99_ms"],
+    )
+
+    if args.save_baseline:
+        config = {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("baseline", "save_baseline", "compare", "url")
+        }
+        save_baseline(args.baseline, results, config)
+    if args.compare:
+        regressions = compare_to_baseline(args.baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Microbenchmarks for tag filtering and response serialization.
+
+``sample_catalog_lookup`` answers the same threshold query as
+``get_optimal_tags`` from a sample catalog entry's presorted tags.
+
+``serialize_*`` goes through the jsonable_encoder + JSONResponse steps FastAPI
+applies to a returned dict; ``fast_serialize_*`` is the FastJSONResponse the
+hot routes return instead. ``compress_*`` times the compression middleware's
+encoders on the rendered image page.
+
+Usage: python -m benchmarks.bench_micro --save-baseline
+       python -m benchmarks.bench_micro --compare --threshold 0.2
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.compression import _Compressor
+from app.models import SampleImage
+from app.responses import FastJSONResponse
+from app.sample_catalog import SampleEntry
+from app.tagging_stub import VOCABULARY
+from app.utils import get_optimal_tags
+from benchmarks.baseline import compare_to_baseline, print_table, save_baseline
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "micro.json")
+
+
+def imagga_tags(rng: random.Random, count: int) -> list:
+    """An Imagga-shaped tag list with confidences spread over 0-100."""
+    return [
+        {
+            "confidence": round(rng.uniform(0, 100), 4),
+            "tag": {"en": f"{rng.choice(VOCABULARY)}_{index}"},
+        }
+        for index in range(count)
+    ]
+
+
+def images_page(rng: random.Random, images: int, tags_per_image: int) -> dict:
+    """A GET /image/images/ page as the handler returns it."""
+    now = datetime.now(timezone.utc)
+    return {
+        "images": [
+            {
+                "id": image_id,
+                "filename": f"image_{image_id}.jpg",
+                "upload_date": now - timedelta(minutes=image_id),
+                "total_tags": tags_per_image,
+                "tags": [
+                    {
+                        "name": rng.choice(VOCABULARY),
+                        "confidence": round(rng.uniform(30, 100), 2),
+                        "is_primary": rng.random() < 0.3,
+                    }
+                    for _ in range(tags_per_image)
+                ],
+            }
+            for image_id in range(images, 0, -1)
+        ],
+        "next_cursor": "MTIzNDU=",
+    }
+
+
+def top_tags_response(rng: random.Random, limit: int) -> dict:
+    """A GET /analytics/top-tags/ response as the handler returns it."""
+    return {
+        "total_images": 1_000_000,
+        "avg_tags_per_image": 9.71,
+        "min_confidence": 30.0,
+        "top_tags": [
+            {
+                "tag_name": tag_name,
+                "occurrence_count": rng.randint(1, 300_000),
+                "image_count": rng.randint(1, 300_000),
+                "percentage_on_images": round(rng.uniform(0, 30), 2),
+                "avg_confidence": round(rng.uniform(30, 100), 2),
+            }
+            for tag_name in VOCABULARY[:limit]
+        ],
+    }
+
+
+def serialize(payload) -> bytes:
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast_serialize(payload) -> bytes:
+    return FastJSONResponse(payload).body
+
+
+def compress(encoding: str, body: bytes) -> bytes:
+    return _Compressor(encoding).compress(body, final=True)
+
+
+def measure(function, repeat: int) -> dict:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=repeat, number=number)) / number
+    return {"calls": number, "per_call_us": round(best * 1_000_000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tags", type=int, default=100, help="tags per Imagga reply")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--large-page-size", type=int, default=500)
+    parser.add_argument("--tags-per-image", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    raw_tags = imagga_tags(rng, args.tags)
+    page = images_page(rng, args.page_size, args.tags_per_image)
+    large_page = images_page(rng, args.large_page_size, args.tags_per_image)
+    top_tags = top_tags_response(rng, 20)
+    rendered_page = fast_serialize(large_page)
+    sample = SampleEntry(
+        SampleImage(
+            id=1,
+            filename="sample.jpg",
+            image_preview_url="",
+            image_full_url="",
+            tags_json=json.dumps(raw_tags),
+            is_active=True,
+        )
+    )
+
+    benchmarks = {
+        "get_optimal_tags": lambda: get_optimal_tags(raw_tags, 30.0, "en"),
+        "sample_catalog_lookup": lambda: sample.analyze(30.0),
+        "serialize_upload": lambda: serialize(
+            {"image_id": 1, "tags": get_optimal_tags(raw_tags, 30.0, "en")}
+        ),
+    }
+    payloads = {
+        "images_page": page,
+        "images_large_page": large_page,
+        "top_tags": top_tags,
+    }
+    for name, payload in payloads.items():
+        benchmarks[f"serialize_{name}"] = lambda payload=payload: serialize(payload)
+        benchmarks[f"fast_serialize_{name}"] = (
+            lambda payload=payload: fast_serialize(payload)
+        )
+    for encoding in ("gzip", "br"):
+        benchmarks[f"compress_{encoding}_large_page"] = (
+            lambda encoding=encoding: compress(encoding, rendered_page)
+        )
+    results = {}
+    for name, function in benchmarks.items():
+        results[name] = measure(function, args.repeat)
+        print(f"{name}: {results[name]['per_call_us']}us per call")
+
+    print_table(results, ["calls", "per_call_us"])
+    for name in payloads:
+        before = results[f"serialize_{name}"]["per_call_us"]
+        after = results[f"fast_serialize_{name}"]["per_call_us"]
+        print(f"  {name}: {before / after:.1f}x faster with FastJSONResponse")
+    for encoding in ("gzip", "br"):
+        size = len(compress(encoding, rendered_page))
+        print(f"  {encoding}: {len(rendered_page)} -> {size} bytes")
+    if args.save_baseline:
+        config = {
+            "tags": args.tags,
+            "page_size": args.page_size,
+            "large_page_size": args.large_page_size,
+        }
+        save_baseline(args.baseline, results, config)
+    if args.compare:
+        regressions = compare_to_baseline(args.baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compare HammingIndex lookups against a linear Hamming scan.
+
+Usage: python -m benchmarks.bench_phash_index --size 3000000 --queries 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from app.phash_index import HammingIndex
+
+
+def linear_scan(hashes: np.ndarray, ids: np.ndarray, query: int, max_distance: int):
+    distances = np.bitwise_count(hashes ^ np.uint64(query))
+    within = distances <= max_distance
+    return sorted(
+        zip(ids[within].tolist(), distances[within].tolist()),
+        key=lambda match: (match[1], match[0]),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=3_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    hashes = rng.integers(0, 2**64, size=args.size, dtype=np.uint64)
+    ids = np.arange(1, args.size + 1, dtype=np.int64)
+
+    # Plant near-duplicates of every query so lookups have something to find.
+    query_positions = rng.choice(args.size, size=args.queries, replace=False)
+    queries = [int(hashes[position]) for position in query_positions]
+    for offset, query in enumerate(queries):
+        flips = rng.choice(64, size=offset % 8, replace=False)
+        hashes[(query_positions[offset] + 1) % args.size] = np.uint64(
+            query ^ sum(1 << int(bit) for bit in flips)
+        )
+
+    started = time.perf_counter()
+    index = HammingIndex()
+    index.add_many(ids, hashes.view(np.int64))
+    build_seconds = time.perf_counter() - started
+    print(f"{args.size} hashes, index built in {build_seconds:.2f}s")
+    print(f"{'distance':>8} {'linear ms':>10} {'index ms':>10} {'speedup':>8}")
+
+    for max_distance in (0, 4, 8, 12):
+        started = time.perf_counter()
+        expected = [linear_scan(hashes, ids, query, max_distance) for query in queries]
+        linear_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        started = time.perf_counter()
+        found = [index.search(query, max_distance) for query in queries]
+        index_ms = (time.perf_counter() - started) * 1000 / len(queries)
+
+        assert found == expected, f"index disagrees with linear scan at {max_distance}"
+        print(
+            f"{max_distance:>8} {linear_ms:>10.3f} {index_ms:>10.3f} "
+            f"{linear_ms / index_ms:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
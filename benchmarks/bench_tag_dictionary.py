@@ -0,0 +1,168 @@
+"""Compare image_tags size and top-tags query time for string vs integer tag keys.
+
+Builds both layouts side by side in a scratch schema, with the same rows and
+indexes as before and after the tags dictionary migration, then drops it.
+
+Usage: python -m benchmarks.bench_tag_dictionary --rows 2000000 --tags 5000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from app.database import engine
+
+SCHEMA = "bench_tag_dictionary"
+
+SETUP = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"""
+    CREATE TABLE {SCHEMA}.tags (
+        id serial PRIMARY KEY,
+        name varchar(255) NOT NULL,
+        language varchar(10) NOT NULL DEFAULT 'en',
+        UNIQUE (name, language)
+    )
+    """,
+    # Realistic tag names: English words are mostly 5-15 characters.
+    f"""
+    INSERT INTO {SCHEMA}.tags (name)
+    SELECT 'tag_' || md5(n::text)::varchar(8) || '_' || n
+    FROM generate_series(1, :tags) AS n
+    """,
+    # Zipf-ish popularity: low ids are picked far more often.
+    f"""
+    CREATE TABLE {SCHEMA}.draws AS
+    SELECT n / :per_image AS image_id,
+           greatest(1, least(:tags, floor(exp(random() * ln(:tags)))))::int AS tag_id,
+           round((random() * 100)::numeric, 2)::float AS confidence
+    FROM generate_series(0, :rows - 1) AS n
+    """,
+    f"""
+    CREATE TABLE {SCHEMA}.by_name (
+        id serial PRIMARY KEY,
+        image_id integer NOT NULL,
+        tag_name varchar(255) NOT NULL,
+        confidence float NOT NULL,
+        language varchar(10),
+        is_primary boolean,
+        UNIQUE (image_id, tag_name)
+    )
+    """,
+    f"""
+    INSERT INTO {SCHEMA}.by_name (image_id, tag_name, confidence, language, is_primary)
+    SELECT DISTINCT ON (d.image_id, d.tag_id)
+           d.image_id, t.name, d.confidence, 'en', false
+    FROM {SCHEMA}.draws d JOIN {SCHEMA}.tags t ON t.id = d.tag_id
+    """,
+    f"CREATE INDEX ON {SCHEMA}.by_name (tag_name, confidence, image_id)",
+    f"""
+    CREATE TABLE {SCHEMA}.by_id (
+        id serial PRIMARY KEY,
+        image_id integer NOT NULL,
+        tag_id integer NOT NULL REFERENCES {SCHEMA}.tags (id),
+        confidence float NOT NULL,
+        language varchar(10),
+        is_primary boolean,
+        UNIQUE (image_id, tag_id)
+    )
+    """,
+    f"""
+    INSERT INTO {SCHEMA}.by_id (image_id, tag_id, confidence, language, is_primary)
+    SELECT b.image_id, t.id, b.confidence, b.language, b.is_primary
+    FROM {SCHEMA}.by_name b JOIN {SCHEMA}.tags t ON t.name = b.tag_name
+    ORDER BY b.id
+    """,
+    f"CREATE INDEX ON {SCHEMA}.by_id (tag_id, confidence, image_id)",
+    f"VACUUM ANALYZE {SCHEMA}.by_name",
+    f"VACUUM ANALYZE {SCHEMA}.by_id",
+    f"VACUUM ANALYZE {SCHEMA}.tags",
+]
+
+# The same shape as rollups.top_tags_sql before and after the migration.
+QUERIES = {
+    "by_name": f"""
+        SELECT tag_name, count(id), avg(confidence)
+        FROM {SCHEMA}.by_name
+        WHERE confidence >= :min_confidence
+        GROUP BY tag_name
+        ORDER BY count(id) DESC, tag_name COLLATE "C"
+        LIMIT 20
+    """,
+    "by_id": f"""
+        SELECT t.name, sum(c.n), sum(c.total) / sum(c.n)
+        FROM (
+            SELECT tag_id, count(id) AS n, sum(confidence) AS total
+            FROM {SCHEMA}.by_id
+            WHERE confidence >= :min_confidence
+            GROUP BY tag_id
+        ) c JOIN {SCHEMA}.tags t ON t.id = c.tag_id
+        GROUP BY t.name
+        ORDER BY sum(c.n) DESC, t.name COLLATE "C"
+        LIMIT 20
+    """,
+}
+
+
+async def run(args):
+    params = {"rows": args.rows, "tags": args.tags, "per_image": args.tags_per_image}
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        started = time.perf_counter()
+        for statement in SETUP:
+            await connection.execute(text(statement), params)
+        print(f"built both layouts in {time.perf_counter() - started:.1f}s")
+
+        try:
+            for table in QUERIES:
+                result = await connection.execute(
+                    text(
+                        "SELECT count(*), pg_relation_size(:name), "
+                        "pg_indexes_size(:name), pg_total_relation_size(:name) "
+                        f"FROM {SCHEMA}.{table}"
+                    ),
+                    {"name": f"{SCHEMA}.{table}"},
+                )
+                rows, heap, indexes, total = result.one()
+                print(
+                    f"{table}: {rows} rows, heap {heap / 2**20:.1f} MiB, "
+                    f"indexes {indexes / 2**20:.1f} MiB, "
+                    f"total {total / 2**20:.1f} MiB"
+                )
+
+            for min_confidence in args.thresholds:
+                for table, query in QUERIES.items():
+                    timings = []
+                    for _ in range(args.repeat):
+                        started = time.perf_counter()
+                        await connection.execute(
+                            text(query), {"min_confidence": min_confidence}
+                        )
+                        timings.append(time.perf_counter() - started)
+                    best_ms = min(timings) * 1000
+                    print(
+                        f"top tags >= {min_confidence:g} on {table}: "
+                        f"best of {args.repeat} {best_ms:.0f}ms"
+                    )
+        finally:
+            if not args.keep:
+                await connection.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--tags", type=int, default=5_000)
+    parser.add_argument("--tags-per-image", type=int, default=10)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0, 50, 90])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help="keep the scratch schema")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Gunicorn hooks; gunicorn loads this file from the working directory.
+
+Workers share Prometheus metrics through files in PROMETHEUS_MULTIPROC_DIR.
+The variable has to be set before prometheus_client is first imported, so
+it is set here, in the master, before any worker is forked.
+"""
+
+import os
+import shutil
+
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's.
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,22 @@
+import os
+
+
+# app.config requires these; nothing under test connects to Postgres or Redis.
+for name, value in {
+    "MODE": "TEST",
+    "LOG_LEVEL": "INFO",
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_USER": "postgres",
+    "DB_PASS": "postgres",
+    "DB_NAME": "tag_analyzer",
+    "REDIS_HOST": "localhost",
+    "REDIS_PORT": "6379",
+    "REDIS_PASSWORD": "",
+    "SECRET_KEY": "test",
+    "ALGORITHM": "HS256",
+    "IMAGGA_API_URL": "http://localhost/v2/tags",
+    "IMAGGA_API_KEY": "test",
+    "IMAGGA_API_SECRET": "test",
+}.items():
+    os.environ.setdefault(name, value)
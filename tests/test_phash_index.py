@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+
+import app.phash_index
+from app.phash_index import PerceptualHashIndex
+
+
+class ImagesTable:
+    """Committed ``(id, perceptual_hash)`` rows, served like the images query."""
+
+    def __init__(self, index: PerceptualHashIndex):
+        self.index = index
+        self.rows = {}
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def stream(self, statement):
+        # Same rows IdCursor.condition selects.
+        cursor = self.index.cursor
+        rows = [
+            (image_id, self.rows[image_id])
+            for image_id in sorted(self.rows)
+            if image_id > cursor.last_id or image_id in cursor.missing
+        ]
+
+        async def result():
+            for row in rows:
+                yield row
+
+        return result()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = ImagesTable(PerceptualHashIndex())
+    monkeypatch.setattr(app.phash_index, "async_session_maker", table)
+    return table
+
+
+def store(table: ImagesTable, image_id: int, perceptual_hash) -> None:
+    # An upload in this process: commit, then add to the index.
+    table.rows[image_id] = perceptual_hash
+    table.index.add(image_id, perceptual_hash)
+
+
+def test_images_added_in_process_are_not_loaded_again(table):
+    index = table.index
+    table.rows.update({1: 11, 2: 22})
+    asyncio.run(index.refresh())
+    assert len(index.index) == 2
+
+    store(table, 4, 44)
+    store(table, 5, None)
+    assert len(index.index) == 3
+    assert asyncio.run(index.refresh()) == 0
+    assert len(index.index) == 3
+
+    # Id 3 commits after 4 and 5; the next refresh still picks it up.
+    table.rows[3] = 33
+    assert asyncio.run(index.refresh()) == 1
+    assert len(index.index) == 4
+    assert [image_id for image_id, _ in index.index.search(33, 0)] == [3]
+
+
+def test_image_streamed_before_it_is_added_is_indexed_once(table):
+    index = table.index
+    table.rows.update({1: 11, 2: 22})
+    asyncio.run(index.refresh())
+
+    # Another request's refresh reads the new row between commit and add.
+    table.rows[3] = 33
+    asyncio.run(index.refresh())
+    index.add(3, 33)
+    assert len(index.index) == 3
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+
+from app.rollups import BUCKET_MAX, BUCKET_MIN, TagHistogram
+
+
+# Mixed case and non-ASCII names check that ties break in byte order, as
+# the SQL fallback's C-collation ORDER BY does.
+TAG_NAMES = ["Sky", "apple", "sky", "ёлка", "Zebra", "zebra", "cat", "car", "éclair"]
+
+
+def synthetic_rows(seed: int) -> list:
+    rng = random.Random(seed)
+    rows = []
+    for tag_name in TAG_NAMES:
+        buckets = rng.sample(range(BUCKET_MIN, BUCKET_MAX + 1), rng.randint(1, 12))
+        for bucket in buckets:
+            # Few distinct counts, so many tags tie at each threshold.
+            occurrences = rng.choice([1, 2, 3])
+            confidence = max(bucket, 0) + rng.random()
+            rows.append((tag_name, bucket, occurrences, occurrences * confidence))
+    rng.shuffle(rows)
+    return rows
+
+
+def brute_force_top_tags(rows: list, threshold: int, limit: int) -> list:
+    totals = {}
+    for tag_name, bucket, occurrences, confidence_sum in rows:
+        if bucket >= threshold:
+            count, total = totals.get(tag_name, (0, 0.0))
+            totals[tag_name] = (count + occurrences, total + confidence_sum)
+    ranked = sorted(totals.items(), key=lambda item: (-item[1][0], item[0]))
+    return [
+        (tag_name, count, total / count, count)
+        for tag_name, (count, total) in ranked[:limit]
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("limit", [1, 4, len(TAG_NAMES)])
+def test_rank_matches_brute_force(seed, limit):
+    rows = synthetic_rows(seed)
+    histogram = TagHistogram()
+    histogram.load(rows)
+
+    for threshold in range(BUCKET_MIN, BUCKET_MAX + 1):
+        got = histogram.rank(threshold - BUCKET_MIN, limit)
+        want = brute_force_top_tags(rows, threshold, limit)
+
+        assert [(row[0], row[1], row[3]) for row in got] == [
+            (row[0], row[1], row[3]) for row in want
+        ], f"threshold {threshold}"
+        assert [row[2] for row in got] == pytest.approx([row[2] for row in want])
+
+
+def test_column_only_answers_whole_thresholds():
+    assert TagHistogram.column(30.0, 12.5) == 30 - BUCKET_MIN
+    assert TagHistogram.column(30.5, 12.5) is None
+    assert TagHistogram.column(BUCKET_MAX + 1, 12.5) is None
+    # Nothing is stored below the lowest confidence, so every bucket counts.
+    assert TagHistogram.column(10.5, 12.5) == 0
+    assert TagHistogram.column(10.5, None) == 0
+
+
+def test_empty_histogram_ranks_nothing():
+    histogram = TagHistogram()
+    histogram.load([])
+    assert histogram.rank(0, 10) == []